@@ -10,28 +10,39 @@ from random import random
 
 import aiohttp
 import json
-from typing import List, Any, Callable, Dict, Literal, Optional
+from typing import List, Any, Callable, Dict, Literal, Optional, TYPE_CHECKING
 import logging
 
 from aiohttp import ClientTimeout
 
 from genghis.api import *
 from genghis.game.formatter import Formatter
-from genghis.game.game import OnlineGame
 
-# Configure root logger
-root_logger = logging.getLogger("root")
-root_logger.setLevel(logging.DEBUG)
+if TYPE_CHECKING:  # The engine imports numba, which the client itself never needs
+    from genghis.game.action import Action, ActionBatch
+    from genghis.game.game import OnlineGame
 
-logging.basicConfig(level=logging.DEBUG)
 
+def configure_logging(level=logging.DEBUG):
+    """
+    Send every log record to stdout through the colored Formatter. Applications call this once at startup,
+    importing the client never touches the logging configuration.
 
-# create console handler with a higher log level
-ch = logging.StreamHandler(stream=sys.stdout)
-ch.setLevel(logging.DEBUG)
+    Args:
+        level: Level of the root logger and of its handler
+    """
+    root_logger = logging.getLogger("root")
+    root_logger.setLevel(level)
+
+    logging.basicConfig(level=level)
+
+    # create console handler with a higher log level
+    ch = logging.StreamHandler(stream=sys.stdout)
+    ch.setLevel(level)
+
+    ch.setFormatter(Formatter())  # custom formatter
+    root_logger.handlers = [ch]  # Make sure to not double print
 
-ch.setFormatter(Formatter())  # custom formatter
-root_logger.handlers = [ch]  # Make sure to not double print
 
 class Status(IntEnum):
     IDLE = 0
@@ -112,8 +123,6 @@ def build_modifier_ids():
 
 MODIFIERS = build_modifier_ids()
 
-print(CustomOption.__members__)
-
 @dataclasses.dataclass
 class QueuePlayerInfo:
     index: int
@@ -157,7 +166,7 @@ class GameInfo:
     players: list[GamePlayerInfo]
     index: int
     replay_id: str
-    state: OnlineGame
+    state: "OnlineGame"
 
 
 
@@ -224,6 +233,9 @@ class GeneralsClient:
         # Chat
         self._chat_channel = None
 
+        # Index of the last attack sent this game, the server expects them to count up from 1
+        self._attack_index = 0
+
         self._queue = None
 
         self.queue = None
@@ -679,6 +691,21 @@ class GeneralsClient:
         await self._chat_channel.send([""])
 
 
+    async def send_attacks(self, actions: "ActionBatch | List[Action]", width: int):
+        """
+        Send one "attack" message per action, in order, each with the next attack index. Passes are skipped.
+
+        Args:
+            actions: An ActionBatch, or Action objects which are packed into one first
+            width: Width of the map, to convert the rows and columns of the actions to tile indices
+        """
+        if not hasattr(actions, "attack_arguments"):
+            from genghis.game.action import ActionBatch  # Only bots that send Action objects need numpy here
+            actions = ActionBatch.from_actions(actions)
+        for start, end, is50 in zip(*(array.tolist() for array in actions.attack_arguments(width))):
+            self._attack_index += 1
+            await self.send_message(["attack", start, end, is50, self._attack_index])
+
     async def set_custom_options(self, options: dict[CustomOption, Any]):
         api_set_value = {}
         for key in options:
@@ -829,6 +856,7 @@ class GeneralsClient:
         # "options":{"map":null,"width":null,"height":null,"game_speed":null,"modifiers":[],"mountain_density":null,"city_density":null,"lookout_density":null,"observatory_density":null,"swamp_density":null,"desert_density":null,"max_players":null,"city_fairness":null,"spawn_fairness":null,"defeat_spectate":null,"spectate_chat":null,"public":null,"chatRecordingDisabled":null,"eventId":null}
         log = self.logger.getChild("game_start")
         self._chat_channel = data["chat_room"]
+        self._attack_index = 0
         log.info(f"Game started! View the replay at https://{self._root_server_url}/replays/{data['replay_id']}")
 
 
@@ -917,5 +945,6 @@ async def main():
 
 
 if __name__ == "__main__":
+    configure_logging()
     asyncio.run(main())
 
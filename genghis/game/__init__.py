@@ -21,4 +21,12 @@ PLAYER_COLORS_HEX = [
         ]
 EFFECT_RECENT_MOVE_START_POSITION = "\033[51m"
 EFFECT_RECENT_MOVE_END_POSITION = "\033[7m"
-EFFECT_DISABLE_RECENT_MOVE = "\033[27m\033[54m"
\ No newline at end of file
+EFFECT_DISABLE_RECENT_MOVE = "\033[27m\033[54m"
+
+
+def warmup() -> float:
+    """
+    Compile (or load from the on-disk cache) every kernel of the game engine, see genghis.game.game.warmup.
+    """
+    from genghis.game.game import warmup as warmup_engine
+    return warmup_engine()
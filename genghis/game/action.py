@@ -3,7 +3,8 @@ from enum import Enum
 import numpy as np
 
 
-from .observation import Observation
+from .bitboard import from_bitboard, move_bitboards, to_bitboard
+from .observation import TENSOR_CHANNELS, Observation
 
 
 
@@ -17,6 +18,49 @@ class Direction(Enum):
 
 
 DIRECTIONS = [Direction.UP, Direction.DOWN, Direction.LEFT, Direction.RIGHT]
+_DIRECTION_INDEX = {direction: index for index, direction in enumerate(DIRECTIONS)}
+# (dy, dx) of each direction, indexed like DIRECTIONS
+DIRECTION_OFFSETS = np.array([direction.value for direction in DIRECTIONS], dtype=np.int16)
+
+# Bit layout of packed actions, from the lowest bit: to_pass, to_split, direction (2 bits), col (14 bits), row
+PASS_BIT = 1
+SPLIT_BIT = 2
+DIRECTION_SHIFT = 2
+COL_SHIFT = 4
+ROW_SHIFT = 18
+COORDINATE_MASK = (1 << 14) - 1
+
+
+def encode_actions(to_pass, row, col, direction, to_split) -> np.ndarray:
+    """
+    Pack actions into int32 codes. Takes scalars or arrays, which are broadcast together.
+
+    Args:
+        to_pass: Whether the action is a pass
+        row: The row to move from, < 8192
+        col: The column to move from, < 16384
+        direction: Index of the direction in DIRECTIONS
+        to_split: Whether the army is split
+
+    Returns:
+        int32 array of the codes
+    """
+    return ((np.asarray(row, dtype=np.int32) << ROW_SHIFT) | (np.asarray(col, dtype=np.int32) << COL_SHIFT)
+            | (np.asarray(direction, dtype=np.int32) << DIRECTION_SHIFT)
+            | (np.asarray(to_split, dtype=np.int32) * SPLIT_BIT) | (np.asarray(to_pass, dtype=np.int32) * PASS_BIT))
+
+
+def decode_actions(codes) -> tuple:
+    """
+    Unpack int32 action codes, the inverse of encode_actions.
+
+    Returns:
+        The (to_pass, row, col, direction, to_split) arrays of the codes
+    """
+    codes = np.asarray(codes, dtype=np.int32)
+    return ((codes & PASS_BIT) != 0, codes >> ROW_SHIFT, (codes >> COL_SHIFT) & COORDINATE_MASK,
+            (codes >> DIRECTION_SHIFT) & 3, (codes & SPLIT_BIT) != 0)
+
 
 class Action(np.ndarray):
     """
@@ -37,13 +81,27 @@ class Action(np.ndarray):
             to_split: Indicates whether the army in (row, col) should be split, then moved in direction.
         """
         if isinstance(direction, Direction):
-            direction = DIRECTIONS.index(direction)
+            direction = _DIRECTION_INDEX[direction]
 
         # Note: np.array.view casts the np.array object to type cls, i.e. Action, without modifying
         # any of the arrays internal representation.
         action_array = np.array([to_pass, row, col, direction, to_split], dtype=np.int8).view(cls)
         return action_array
 
+    @classmethod
+    def unpack(cls, code: int) -> "Action":
+        """
+        Create an Action from its packed code, see encode_actions.
+        """
+        to_pass, row, col, direction, to_split = decode_actions(code)
+        return cls(bool(to_pass), int(row), int(col), int(direction), bool(to_split))
+
+    def pack(self) -> int:
+        """
+        Return the packed int32 code of the action, see encode_actions.
+        """
+        return int(encode_actions(self[0], self[1], self[2], self[3], self[4]))
+
     def is_pass(self) -> bool:
         return self[0] == 1
 
@@ -64,6 +122,100 @@ class Action(np.ndarray):
         return str(self)
 
 
+class ActionBatch:
+    """
+    Many actions, stored as one int32 array of packed codes (see encode_actions) and the player making each of them.
+    No Action objects are created, and it can be passed as is to LocalGame.process_turn or
+    GeneralsClient.send_attacks.
+    """
+
+    __slots__ = ("codes", "players")
+
+    def __init__(self, codes, players=None):
+        """
+        Args:
+            codes: Packed actions, see encode_actions
+            players: Index of the player making each action, 0 for every action by default
+        """
+        self.codes = np.asarray(codes, dtype=np.int32).reshape(-1)
+        if players is None:
+            players = np.zeros(len(self.codes), dtype=np.int16)
+        self.players = np.broadcast_to(np.asarray(players, dtype=np.int16), self.codes.shape)
+
+    @classmethod
+    def from_arrays(cls, row, col, direction, to_split=False, to_pass=False, players=None) -> "ActionBatch":
+        """
+        Create a batch from arrays of the fields of the actions, see encode_actions.
+        """
+        return cls(encode_actions(to_pass, row, col, direction, to_split), players)
+
+    @classmethod
+    def from_actions(cls, actions, players=None) -> "ActionBatch":
+        """
+        Create a batch from Action objects.
+        """
+        fields = np.array(actions, dtype=np.int32).reshape(-1, 5)
+        return cls(encode_actions(*fields.T), players)
+
+    @classmethod
+    def from_moves(cls, moves: np.ndarray) -> "ActionBatch":
+        """
+        Create a batch from (num_moves, 6) move rows of [player, start_y, start_x, end_y, end_x, split], e.g. from
+        LocalGame.generate_valid_moves_array. Every move must be to an adjacent tile.
+        """
+        moves = np.asarray(moves).reshape(-1, 6)
+        offsets = moves[:, 3:5] - moves[:, 1:3]
+        direction = np.argmax(np.all(offsets[:, np.newaxis] == DIRECTION_OFFSETS, axis=2), axis=1)
+        return cls.from_arrays(moves[:, 1], moves[:, 2], direction, moves[:, 5], players=moves[:, 0])
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Action.unpack(self.codes[index])
+        return ActionBatch(self.codes[index], self.players[index])
+
+    def decode(self) -> tuple:
+        """
+        Return the (to_pass, row, col, direction, to_split) arrays of the actions, see decode_actions.
+        """
+        return decode_actions(self.codes)
+
+    def to_moves(self) -> np.ndarray:
+        """
+        Convert the actions to the move rows of the engine, skipping passes.
+
+        Returns:
+            int16 array of shape (num_moves, 6) with rows of [player, start_y, start_x, end_y, end_x, split]
+        """
+        to_pass, row, col, direction, to_split = self.decode()
+        moving = ~to_pass
+        moves = np.empty((np.count_nonzero(moving), 6), dtype=np.int16)
+        moves[:, 0] = self.players[moving]
+        moves[:, 1] = row[moving]
+        moves[:, 2] = col[moving]
+        moves[:, 3:5] = moves[:, 1:3] + DIRECTION_OFFSETS[direction[moving]]
+        moves[:, 5] = to_split[moving]
+        return moves
+
+    def attack_arguments(self, width: int) -> tuple:
+        """
+        Arguments of the generals.io "attack" messages of the actions, skipping passes.
+
+        Args:
+            width: Width of the map
+
+        Returns:
+            The start tile indices, end tile indices and whether each attack only moves half the army (is50)
+        """
+        moves = self.to_moves().astype(np.int64)
+        return moves[:, 1] * width + moves[:, 2], moves[:, 3] * width + moves[:, 4], moves[:, 5] != 0
+
+    def __repr__(self) -> str:
+        return f"ActionBatch({len(self)} actions)"
+
+
 def compute_valid_move_mask(observation: Observation) -> np.ndarray:
     """
     Return a mask of the valid moves for a given observation.
@@ -80,34 +232,88 @@ def compute_valid_move_mask(observation: Observation) -> np.ndarray:
 
         I.e. valid_action_mask[i, j, k] is 1 if action k is valid in cell (i, j).
     """
-    height, width = observation.owned_cells.shape
+    width = observation.owned_cells.shape[1]
 
-    ownership_channel = observation.owned_cells
-    more_than_1_army = (observation.armies > 1) * ownership_channel
-    owned_cells_indices = np.argwhere(more_than_1_army)
-    valid_action_mask = np.zeros((height, width, 4), dtype=bool)
+    more_than_1_army = (observation.armies > 1) & (observation.owned_cells != 0)
+    # Bits shifted in from outside the grid are 0, so bounds need no separate check
+    masks = move_bitboards(to_bitboard(more_than_1_army), to_bitboard(observation.mountains == 0), width)
+    return np.stack([from_bitboard(mask, width) for mask in masks], axis=-1)
 
-    if np.sum(ownership_channel) == 0:
-        return valid_action_mask
 
-    # check if destination is road
-    passable_cells = 1 - observation.mountains
+_ARMIES, _MOUNTAINS, _OWNED = (TENSOR_CHANNELS.index(name) for name in ("armies", "mountains", "owned_cells"))
 
-    for channel_index, direction in enumerate(DIRECTIONS):
-        destinations = owned_cells_indices + direction.value
 
-        # check if destination is in grid bounds
-        in_first_boundary = np.all(destinations >= 0, axis=1)
-        in_height_boundary = destinations[:, 0] < height
-        in_width_boundary = destinations[:, 1] < width
-        destinations = destinations[in_first_boundary & in_height_boundary & in_width_boundary]
+def compute_valid_move_mask_batch(obs_tensor: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Return the masks of the valid moves of a batch of observations, like compute_valid_move_mask.
 
-        # assert that every value is either 0 or 1 in passable cells
-        passable_cell_indices = passable_cells[destinations[:, 0], destinations[:, 1]] == 1
-        action_destinations = destinations[passable_cell_indices]
+    Args:
+        obs_tensor: (B, 15, H, W) observation tensor, e.g. from observation.encode_batch. Padding is never valid
+            since it is padded with mountains.
+        out: (B, H, W, 4) bool array to write the masks into, allocated if None
 
-        # get valid action mask for a given direction
-        valid_source_indices = action_destinations - direction.value
-        valid_action_mask[valid_source_indices[:, 0], valid_source_indices[:, 1], channel_index] = 1.0
+    Returns:
+        (B, H, W, 4) bool array, where out[b, i, j, k] is True if moving in direction DIRECTIONS[k] from the cell
+        (i, j) of observation b is valid
+    """
+    batch, _, height, width = obs_tensor.shape
+    if out is None:
+        out = np.empty((batch, height, width, 4), dtype=bool)
+    assert out.shape == (batch, height, width, 4), f"out has shape {out.shape}, expected {(batch, height, width, 4)}."
+
+    sources = (obs_tensor[:, _ARMIES] > 1) & (obs_tensor[:, _OWNED] != 0)
+    passable = obs_tensor[:, _MOUNTAINS] == 0
+    # Each direction compares the sources with the passable mask shifted by one cell, the edge they would leave
+    # the grid from stays False
+    out[:, 0, :, 0] = False
+    np.logical_and(sources[:, 1:, :], passable[:, :-1, :], out=out[:, 1:, :, 0])
+    out[:, -1, :, 1] = False
+    np.logical_and(sources[:, :-1, :], passable[:, 1:, :], out=out[:, :-1, :, 1])
+    out[:, :, 0, 2] = False
+    np.logical_and(sources[:, :, 1:], passable[:, :, :-1], out=out[:, :, 1:, 2])
+    out[:, :, -1, 3] = False
+    np.logical_and(sources[:, :, :-1], passable[:, :, 1:], out=out[:, :, :-1, 3])
+    return out
+
+
+def flat_action_mask(move_mask: np.ndarray) -> np.ndarray:
+    """
+    Expand (..., H, W, 4) move masks to masks of flat policy indices (see flat_action_index), where a move is
+    valid with and without splitting.
+
+    Returns:
+        bool array of shape (..., H * W * 4 * 2)
+    """
+    expanded = np.broadcast_to(move_mask[..., np.newaxis], move_mask.shape + (2,))
+    return expanded.reshape(move_mask.shape[:-3] + (-1,))
+
+
+def flat_action_index(row, col, direction, split, width: int):
+    """
+    Index of moves in a flat policy over (row, col, direction, split), i.e. a policy of shape (H, W, 4, 2)
+    flattened. Takes scalars or arrays.
 
-    return valid_action_mask
\ No newline at end of file
+    Args:
+        row: Row of the moved cell
+        col: Column of the moved cell
+        direction: Index of the direction in DIRECTIONS
+        split: Whether the army is split
+        width: Width of the grid the policy covers
+
+    Returns:
+        The flat indices
+    """
+    return ((np.asarray(row) * width + col) * 4 + direction) * 2 + np.asarray(split, dtype=np.int64)
+
+
+def unflatten_action_index(index, width: int) -> tuple:
+    """
+    Inverse of flat_action_index. Takes a scalar or an array of indices.
+
+    Returns:
+        The (row, col, direction, split) of the indices
+    """
+    cell_direction, split = np.divmod(index, 2)
+    cell, direction = np.divmod(cell_direction, 4)
+    row, col = np.divmod(cell, width)
+    return row, col, direction, split.astype(bool)
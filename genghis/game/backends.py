@@ -0,0 +1,56 @@
+"""
+Registry of the game engine backends. Every backend plays by the same rules and implements the core LocalGame
+interface: generate_valid_moves, generate_valid_moves_array, make_move, process_turn and display_board, the flat
+owners_flat/armies_flat/types_flat state kept in sync with the game's Grid, and the _turn and priority_player
+counters. Anything beyond that (undo log, snapshots, zobrist hash, incremental stats...) is only provided by the
+numba backend.
+
+create_game is the entry point that works everywhere: backends are imported lazily, so it can create a pure
+Python game on hosts where numba is not installed. LocalGame(grid, backend=...) dispatches to it too, but importing
+LocalGame requires numba.
+Run testing/differential_backends.py after changing any backend to check that they still agree.
+"""
+import importlib
+
+GAME_BACKENDS = {
+    "numba": "genghis.game.game:LocalGame",
+    "python": "genghis.game.game_pure_python_experimental:PythonLocalGame",
+    "batched": "genghis.game.game:BatchedBackendGame",
+}
+
+
+def register_backend(name: str, target: str):
+    """
+    Add a backend, or replace an existing one.
+
+    Args:
+        name: Name used to select the backend, e.g. LocalGame(grid, backend=name)
+        target: Import path of the game class as "module:ClassName". Its constructor must take a Grid and an
+            optional random generator (see LocalGame.__init__).
+    """
+    assert ":" in target, "target must have the form 'module:ClassName'."
+    GAME_BACKENDS[name] = target
+
+
+def get_backend(name: str) -> type:
+    """
+    Import and return the game class of a backend.
+    """
+    assert name in GAME_BACKENDS, f"Unknown backend {name!r}, expected one of {sorted(GAME_BACKENDS)}."
+    module_name, class_name = GAME_BACKENDS[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_game(grid, backend: str = "numba", rng=None):
+    """
+    Create a game on grid with the given backend.
+
+    Args:
+        grid: The Grid to play on. Like LocalGame, the game updates the grid's arrays as it is played.
+        backend: One of the names in GAME_BACKENDS
+        rng: Random generator, seed sequence or seed of the game. By default, a child stream of grid.rng is used.
+
+    Returns:
+        The game object of the backend
+    """
+    return get_backend(backend)(grid, rng=rng)
@@ -0,0 +1,121 @@
+"""
+Bitboards: boolean planes packed into uint64 words, with one row of words per board row. Bit x of a row is bit
+x % 64 of its word x // 64, and bits past the width of the board are always 0. A bitboard takes 8x less memory
+than a bool plane, and expanding a mask to its neighbours is a handful of shifts.
+
+Every function accepts any number of leading batch dimensions, i.e. bitboards of shape (..., height, words).
+"""
+from functools import lru_cache
+
+import numpy as np
+
+WORD_BITS = 64
+
+
+def num_words(width: int) -> int:
+    """Number of uint64 words per row of a board of the given width."""
+    return (width + WORD_BITS - 1) // WORD_BITS
+
+
+@lru_cache(maxsize=None)
+def row_mask(width: int) -> np.ndarray:
+    """
+    Bitboard row with the bits of every column of the board set, for clearing the bits shifted past the last column.
+    """
+    return to_bitboard(np.ones((1, width), dtype=bool))[0]
+
+
+def to_bitboard(plane: np.ndarray) -> np.ndarray:
+    """
+    Pack a boolean plane into a bitboard.
+
+    Args:
+        plane: Array of shape (..., height, width). Nonzero values are set bits.
+
+    Returns:
+        uint64 array of shape (..., height, num_words(width))
+    """
+    width = plane.shape[-1]
+    packed = np.packbits(plane.astype(bool, copy=False), axis=-1, bitorder="little")
+    padding = num_words(width) * 8 - packed.shape[-1]
+    if padding:
+        packed = np.pad(packed, [(0, 0)] * (packed.ndim - 1) + [(0, padding)])
+    return packed.view("<u8").astype(np.uint64, copy=False)
+
+
+def from_bitboard(bitboard: np.ndarray, width: int) -> np.ndarray:
+    """
+    Unpack a bitboard into a boolean plane.
+
+    Args:
+        bitboard: uint64 array of shape (..., height, words)
+        width: Width of the board
+
+    Returns:
+        bool array of shape (..., height, width)
+    """
+    packed = np.ascontiguousarray(bitboard).astype("<u8", copy=False).view(np.uint8)
+    return np.unpackbits(packed, axis=-1, count=width, bitorder="little").view(bool)
+
+
+def shift_up(bitboard: np.ndarray) -> np.ndarray:
+    """Move every bit one row up, i.e. the result at (y, x) is the bit at (y + 1, x)."""
+    shifted = np.zeros_like(bitboard)
+    shifted[..., :-1, :] = bitboard[..., 1:, :]
+    return shifted
+
+
+def shift_down(bitboard: np.ndarray) -> np.ndarray:
+    """Move every bit one row down, i.e. the result at (y, x) is the bit at (y - 1, x)."""
+    shifted = np.zeros_like(bitboard)
+    shifted[..., 1:, :] = bitboard[..., :-1, :]
+    return shifted
+
+
+def shift_left(bitboard: np.ndarray) -> np.ndarray:
+    """Move every bit one column left, i.e. the result at (y, x) is the bit at (y, x + 1)."""
+    shifted = bitboard >> 1
+    if bitboard.shape[-1] > 1:  # Carry the lowest bit of each word into the word before it
+        shifted[..., :-1] |= bitboard[..., 1:] << (WORD_BITS - 1)
+    return shifted
+
+
+def shift_right(bitboard: np.ndarray, width: int) -> np.ndarray:
+    """Move every bit one column right, i.e. the result at (y, x) is the bit at (y, x - 1)."""
+    shifted = bitboard << 1
+    if bitboard.shape[-1] > 1:  # Carry the highest bit of each word into the word after it
+        shifted[..., 1:] |= bitboard[..., :-1] >> (WORD_BITS - 1)
+    shifted &= row_mask(width)
+    return shifted
+
+
+def dilate(bitboard: np.ndarray, width: int) -> np.ndarray:
+    """
+    Set every bit within the 3x3 neighbourhood of a set bit, like scipy.ndimage.maximum_filter(plane, size=3).
+    This is how vision spreads from owned tiles.
+    """
+    row = bitboard | shift_left(bitboard) | shift_right(bitboard, width)
+    return row | shift_up(row) | shift_down(row)
+
+
+def move_bitboards(sources: np.ndarray, passable: np.ndarray, width: int) -> tuple[np.ndarray, ...]:
+    """
+    Bits of the tiles that can move in each direction.
+
+    Args:
+        sources: Bitboard of the tiles a move can start from
+        passable: Bitboard of the tiles a move can end on
+        width: Width of the board
+
+    Returns:
+        One bitboard per direction, in the order of genghis.game.action.DIRECTIONS (up, down, left, right)
+    """
+    return (sources & shift_down(passable),
+            sources & shift_up(passable),
+            sources & shift_right(passable, width),
+            sources & shift_left(passable))
+
+
+def popcount(bitboard: np.ndarray) -> int:
+    """Number of set bits."""
+    return int(np.bitwise_count(bitboard).sum())
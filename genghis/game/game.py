@@ -1,14 +1,19 @@
 import numpy as np
 from enum import Enum
-import random
+import copy
+import math
+from collections import namedtuple
+from functools import lru_cache
 import time
 from numba import njit, prange
-from line_profiler import profile
 import re
 from __init__ import EFFECT_DISABLE_RECENT_MOVE, EFFECT_RECENT_MOVE_END_POSITION, EFFECT_RECENT_MOVE_START_POSITION, \
     PLAYER_COLORS_HEX, TileType
+from genghis.game.action import ActionBatch
+from genghis.game.backends import create_game
 from genghis.game.move import Move
-from grid import Grid
+from genghis.game.observation import encode_perspectives
+from grid import Grid, pack_tiles
 
 
 def color(index=None, hex=None):
@@ -24,7 +29,7 @@ def end_color():
     return "\x1B[0m"
 
 
-@njit
+@njit(cache=True)
 def _precompute_adjacents(height, width):
     adjacents = np.full((height * width * 4, 2), -1, dtype=np.int16)
     directions = [(-1, 0), (0, 1), (1, 0), (0, -1)]  # (dy, dx)
@@ -39,17 +44,394 @@ def _precompute_adjacents(height, width):
     return adjacents
 
 
-@njit
-def _execute_move(move, owners, armies, types, height, width):
+@lru_cache(maxsize=None)
+def _shared_adjacents(height, width):
+    """
+    Adjacency table of a board shape, shared by every game of that shape. It must not be written to.
+    """
+    return _precompute_adjacents(height, width)
+
+
+def _grow_rows(buffer, rows):
+    """
+    Return buffer if it has at least the given number of rows, else a new zeroed buffer with enough rows (at least
+    double the old size, so that repeated growth stays amortized O(1)).
+    """
+    if rows <= len(buffer):
+        return buffer
+    return np.zeros((max(rows, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+
+
+def _root_arrays(arrays):
+    # The arrays owning the memory of the given arrays and views, each counted once
+    roots = {}
+    for array in arrays:
+        while isinstance(array.base, np.ndarray):
+            array = array.base
+        roots[id(array)] = array
+    return roots.values()
+
+
+PARALLEL_MOVE_GENERATION_THRESHOLD = 2048
+
+_NO_MOVES = np.zeros((0, 6), dtype=np.int16)
+
+ZOBRIST_SEED = 0x6E6768
+ZOBRIST_NUM_TYPES = 8
+ZOBRIST_ARMY_BUCKETS = 64
+
+# Bookkeeping that rides along with the board state. Kernels that write a tile call _tile_changing right before
+# the write and _tile_changed right after it, which is where the undo log, the Zobrist hash, the per-player tile
+# index, the player statistics and the legal moves are kept up to date.
+GameTracker = namedtuple("GameTracker", ["undo_index", "undo_owner", "undo_army", "undo_type", "undo_len",
+                                         "recording",
+                                         "zobrist_owner", "zobrist_type", "zobrist_army", "zobrist_hash",
+                                         "tile_head", "tile_next", "tile_prev", "tile_count",
+                                         "army_count", "city_count",
+                                         "passable_dirs", "legal_dirs", "legal_count",
+                                         "vision_neighbours", "vision_owner", "vision_bits",
+                                         "changed_tiles", "changed_len", "changed_mark"])
+
+
+@lru_cache(maxsize=None)
+def _zobrist_keys(size, num_players):
+    """
+    Zobrist keys for a board shape. They are derived from a fixed seed so hashes of games with the same shape
+    can be compared across processes.
+    """
+    rng = np.random.default_rng([ZOBRIST_SEED, size, num_players])
+    keys = rng.integers(0, 2 ** 64, size=size * (num_players + 1 + ZOBRIST_NUM_TYPES + ZOBRIST_ARMY_BUCKETS)
+                        + 2 + num_players, dtype=np.uint64, endpoint=False)
+    owner_end = size * (num_players + 1)
+    type_end = owner_end + size * ZOBRIST_NUM_TYPES
+    army_end = type_end + size * ZOBRIST_ARMY_BUCKETS
+    return (keys[:owner_end].reshape(size, num_players + 1),  # Indexed by owner + 1, so neutral tiles are 0
+            keys[owner_end:type_end].reshape(size, ZOBRIST_NUM_TYPES),
+            keys[type_end:army_end].reshape(size, ZOBRIST_ARMY_BUCKETS),
+            keys[army_end:army_end + 2],  # Turn parity
+            keys[army_end + 2:])  # Priority player
+
+
+@njit(cache=True)
+def _passable_directions(adjacent_indices, types, width):
+    # Bit j is set if the j-th neighbour of a tile (in _precompute_adjacents order) exists and isn't a mountain
+    passable_dirs = np.zeros(types.size, dtype=np.uint8)
+    for i in range(types.size):
+        for j in range(4):
+            end_y, end_x = adjacent_indices[i * 4 + j]
+            if end_y != -1 and types[end_y * width + end_x] != TileType.MOUNTAIN.value:
+                passable_dirs[i] |= 1 << j
+    return passable_dirs
+
+
+@lru_cache(maxsize=None)
+def _vision_neighbourhoods(height, width):
+    """
+    Indices of the tiles in the 3x3 neighbourhood of every tile (the tile itself included), padded with -1 at the
+    end. Shared by every game of the same shape.
+    """
+    ys, xs = np.divmod(np.arange(height * width), width)
+    neighbourhoods = np.full((height * width, 9), -1, dtype=np.int32)
+    counts = np.zeros(height * width, dtype=np.int64)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            ny, nx = ys + dy, xs + dx
+            inside = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+            neighbourhoods[inside, counts[inside]] = (ny * width + nx)[inside]
+            counts += inside
+    return neighbourhoods
+
+
+# Tracker arrays that hold state derived from the board, as opposed to the static tables and the undo and
+# changed-tile logs. They are views into one block of memory, so snapshots, restore and fork copy the whole tracker
+# state with a single np.copyto instead of rebuilding it tile by tile.
+TrackerState = namedtuple("TrackerState", ["tile_head", "tile_next", "tile_prev", "tile_count", "army_count",
+                                           "city_count", "legal_dirs", "legal_count", "vision_owner", "vision_bits",
+                                           "zobrist_hash"])
+
+
+@lru_cache(maxsize=None)
+def _tracker_state_layout(size, num_players):
+    """
+    (start, nbytes, dtype, shape) of every TrackerState array in the block, and the size of the block.
+    """
+    # The tiles of each player form a doubly linked list threaded through tile_next and tile_prev, so the tile
+    # index costs O(tiles) whatever the number of players
+    arrays = TrackerState(tile_head=(np.int32, (num_players,)),  # First tile of each player, -1 if none
+                          tile_next=(np.int32, (size,)),  # Next tile of the same owner, -1 at the end
+                          tile_prev=(np.int32, (size,)),  # Previous tile of the same owner, -1 at the head
+                          tile_count=(np.int32, (num_players,)),
+                          army_count=(np.int64, (num_players,)),
+                          city_count=(np.int32, (num_players,)),
+                          legal_dirs=(np.uint8, (size,)),  # passable_dirs of tiles that can move, else 0
+                          legal_count=(np.int32, (num_players,)),
+                          vision_owner=(np.int8, (size,)),  # Owner of each tile as seen by vision_bits
+                          vision_bits=(np.uint32, (size,)),  # Bit p set if p owns a tile in the 3x3
+                          zobrist_hash=(np.uint64, (1,)))
+    layout, start = [], 0
+    for dtype, shape in arrays:
+        nbytes = np.dtype(dtype).itemsize * math.prod(shape)
+        layout.append((start, nbytes, dtype, shape))
+        start += -(-nbytes // 8) * 8  # Every array starts on a multiple of 8 bytes
+    return tuple(layout), start
+
+
+def _new_tracker_state(size, num_players):
+    layout, block_size = _tracker_state_layout(size, num_players)
+    block = np.zeros(block_size, dtype=np.uint8)
+    state = TrackerState(*(block[start:start + nbytes].view(dtype).reshape(shape)
+                           for start, nbytes, dtype, shape in layout))
+    state.tile_head.fill(-1)
+    state.vision_owner.fill(-1)
+    return state
+
+
+def _tracker_state_block(tracker):
+    # The block of memory holding every TrackerState array of tracker
+    return tracker.tile_head.base
+
+
+def _reset_changed_tiles(tracker):
+    # Same as _clear_changed_tiles, without the cost of calling a compiled function from Python
+    if tracker.changed_len[0]:
+        tracker.changed_mark[tracker.changed_tiles[:tracker.changed_len[0]]] = False
+        tracker.changed_len[0] = 0
+
+
+def _new_tracker(size, num_players, passable_dirs, vision_neighbours):
+    zobrist_owner, zobrist_type, zobrist_army, _, _ = _zobrist_keys(size, num_players)
+    # The undo log keeps the index and the previous owner, armies and type of every changed tile in its own column,
+    # all grown on demand
+    return GameTracker(undo_index=np.empty(0, dtype=np.int32),
+                       undo_owner=np.empty(0, dtype=np.int8),
+                       undo_army=np.empty(0, dtype=np.int32),
+                       undo_type=np.empty(0, dtype=np.uint8),
+                       undo_len=np.zeros(1, dtype=np.int64),
+                       recording=np.zeros(1, dtype=np.bool_),
+                       zobrist_owner=zobrist_owner,
+                       zobrist_type=zobrist_type,
+                       zobrist_army=zobrist_army,
+                       passable_dirs=passable_dirs,  # Static, mountains never change
+                       vision_neighbours=vision_neighbours,  # Static and shared, see _vision_neighbourhoods
+                       changed_tiles=np.zeros(size, dtype=np.int32),  # Tiles changed since the turn started
+                       changed_len=np.zeros(1, dtype=np.int64),
+                       changed_mark=np.zeros(size, dtype=np.bool_),
+                       **_new_tracker_state(size, num_players)._asdict())
+
+
+@njit(cache=True, inline='always')
+def _popcount4(bits):
+    return (bits & 1) + (bits >> 1 & 1) + (bits >> 2 & 1) + (bits >> 3 & 1)
+
+
+@njit(cache=True, inline='always')
+def _army_bucket(armies):
+    # Exact below 32 armies, then one bucket per power of two
+    if armies < 32:
+        return armies
+    bucket = 27
+    while armies > 1:
+        armies >>= 1
+        bucket += 1
+    return min(bucket, ZOBRIST_ARMY_BUCKETS - 1)
+
+
+@njit(cache=True, inline='always')
+def _zobrist_tile(tracker, idx, owners, armies, types):
+    return (tracker.zobrist_owner[idx, owners[idx] + 1] ^ tracker.zobrist_type[idx, types[idx]]
+            ^ tracker.zobrist_army[idx, _army_bucket(armies[idx])])
+
+
+@njit(cache=True, inline='always')
+def _untrack_tile(tracker, idx, owners, armies, types):
+    tracker.zobrist_hash[0] ^= _zobrist_tile(tracker, idx, owners, armies, types)
+    owner = owners[idx]
+    if owner != -1:
+        # Unlink the tile from its owner's list
+        prev = tracker.tile_prev[idx]
+        next_ = tracker.tile_next[idx]
+        if prev == -1:
+            tracker.tile_head[owner] = next_
+        else:
+            tracker.tile_next[prev] = next_
+        if next_ != -1:
+            tracker.tile_prev[next_] = prev
+        tracker.tile_count[owner] -= 1
+        tracker.army_count[owner] -= armies[idx]
+        if types[idx] == TileType.CITY.value:
+            tracker.city_count[owner] -= 1
+        tracker.legal_count[owner] -= _popcount4(tracker.legal_dirs[idx])
+        tracker.legal_dirs[idx] = 0
+
+
+@njit(cache=True, inline='always')
+def _track_tile(tracker, idx, owners, armies, types):
+    tracker.zobrist_hash[0] ^= _zobrist_tile(tracker, idx, owners, armies, types)
+    owner = owners[idx]
+    if owner != -1:
+        # Push the tile at the head of its owner's list
+        head = tracker.tile_head[owner]
+        tracker.tile_next[idx] = head
+        tracker.tile_prev[idx] = -1
+        if head != -1:
+            tracker.tile_prev[head] = idx
+        tracker.tile_head[owner] = idx
+        tracker.tile_count[owner] += 1
+        tracker.army_count[owner] += armies[idx]
+        if types[idx] == TileType.CITY.value:
+            tracker.city_count[owner] += 1
+        if armies[idx] >= 2:
+            tracker.legal_dirs[idx] = tracker.passable_dirs[idx]
+            tracker.legal_count[owner] += _popcount4(tracker.passable_dirs[idx])
+
+
+@njit(cache=True)
+def _rebuild_tracker(tracker, owners, armies, types):
+    # Same as calling _track_tile on every tile, but written out: passing the tracker to a function once per tile
+    # costs a reference count update per array, which dominates a loop over the whole board.
+    board_hash = np.uint64(0)
+    tracker.tile_head[:] = -1
+    tracker.tile_count[:] = 0
+    tracker.army_count[:] = 0
+    tracker.city_count[:] = 0
+    tracker.legal_dirs[:] = 0
+    tracker.legal_count[:] = 0
+    tracker.vision_bits[:] = 0
+    tracker.changed_mark[:] = False
+    tracker.changed_len[0] = 0
+    for i in range(owners.size - 1, -1, -1):  # Backwards, so every list ends up in increasing order
+        board_hash ^= _zobrist_tile(tracker, i, owners, armies, types)
+        owner = owners[i]
+        if owner != -1:
+            head = tracker.tile_head[owner]
+            tracker.tile_next[i] = head
+            tracker.tile_prev[i] = -1
+            if head != -1:
+                tracker.tile_prev[head] = i
+            tracker.tile_head[owner] = i
+            tracker.tile_count[owner] += 1
+            tracker.army_count[owner] += armies[i]
+            if types[i] == TileType.CITY.value:
+                tracker.city_count[owner] += 1
+            if armies[i] >= 2:
+                tracker.legal_dirs[i] = tracker.passable_dirs[i]
+                tracker.legal_count[owner] += _popcount4(tracker.passable_dirs[i])
+            for k in range(9):
+                n = tracker.vision_neighbours[i, k]
+                if n == -1:
+                    break
+                tracker.vision_bits[n] |= np.uint32(1) << owner
+        tracker.vision_owner[i] = owner
+    tracker.zobrist_hash[0] = board_hash
+
+
+@njit(cache=True)
+def _expand_legal_moves(player, tracker, adjacent_indices, moves_buffer, width):
+    move_count = 0
+    start_idx = tracker.tile_head[player]
+    while start_idx != -1:
+        legal_dirs = tracker.legal_dirs[start_idx]
+        for j in range(4):
+            if legal_dirs >> j & 1:
+                end_y, end_x = adjacent_indices[start_idx * 4 + j]
+                moves_buffer[move_count, 0] = player
+                moves_buffer[move_count, 1] = start_idx // width
+                moves_buffer[move_count, 2] = start_idx % width
+                moves_buffer[move_count, 3] = end_y
+                moves_buffer[move_count, 4] = end_x
+                moves_buffer[move_count, 5] = 0
+                move_count += 1
+        start_idx = tracker.tile_next[start_idx]
+    return move_count
+
+
+@njit(cache=True)
+def _list_tiles(tracker, player, out):
+    idx = tracker.tile_head[player]
+    for k in range(out.size):
+        out[k] = idx
+        idx = tracker.tile_next[idx]
+
+
+@njit(cache=True, inline='always')
+def _tile_changing(tracker, idx, owners, armies, types):
+    if tracker.recording[0]:
+        n = tracker.undo_len[0]
+        tracker.undo_index[n] = idx
+        tracker.undo_owner[n] = owners[idx]
+        tracker.undo_army[n] = armies[idx]
+        tracker.undo_type[n] = types[idx]
+        tracker.undo_len[0] = n + 1
+    _untrack_tile(tracker, idx, owners, armies, types)
+
+
+@njit(cache=True)
+def _clear_changed_tiles(tracker):
+    for k in range(tracker.changed_len[0]):
+        tracker.changed_mark[tracker.changed_tiles[k]] = False
+    tracker.changed_len[0] = 0
+
+
+@njit(cache=True, inline='always')
+def _tile_changed(tracker, idx, owners, armies, types):
+    _track_tile(tracker, idx, owners, armies, types)
+    # Add idx to the changed tiles and, if its owner changed, recompute the vision of its 3x3 neighbourhood from
+    # the owners around each neighbour. Tiles that become visible or hidden to a player are added to the changed
+    # tiles too.
+    changed_owner = tracker.vision_owner[idx] != owners[idx]
+    tracker.vision_owner[idx] = owners[idx]
+    for k in range(-1, 9 if changed_owner else 0):
+        toggled = k == -1
+        n = idx
+        if k >= 0:
+            n = tracker.vision_neighbours[idx, k]
+            if n == -1:
+                break
+            bits = np.uint32(0)
+            for kk in range(9):
+                m = tracker.vision_neighbours[n, kk]
+                if m == -1:
+                    break
+                if tracker.vision_owner[m] != -1:
+                    bits |= np.uint32(1) << tracker.vision_owner[m]
+            toggled = bits != tracker.vision_bits[n]
+            tracker.vision_bits[n] = bits
+        if toggled and not tracker.changed_mark[n]:
+            tracker.changed_mark[n] = True
+            tracker.changed_tiles[tracker.changed_len[0]] = n
+            tracker.changed_len[0] += 1
+
+
+@njit(cache=True)
+def _undo_tiles(tracker, stop, owners, armies, types):
+    for n in range(tracker.undo_len[0] - 1, stop - 1, -1):
+        idx = tracker.undo_index[n]
+        _untrack_tile(tracker, idx, owners, armies, types)
+        owners[idx] = tracker.undo_owner[n]
+        armies[idx] = tracker.undo_army[n]
+        types[idx] = tracker.undo_type[n]
+        _tile_changed(tracker, idx, owners, armies, types)
+    tracker.undo_len[0] = stop
+
+
+@njit(cache=True)
+def _execute_move(move, owners, armies, types, height, width, tracker=None):
     player, start_y, start_x, end_y, end_x, split = move
     start_idx = start_y * width + start_x
     end_idx = end_y * width + end_x
+    if start_idx == end_idx:
+        # Moving onto the start tile changes nothing, and the tracker can't log the same tile twice in one change
+        return -1
 
     attack_armies = armies[start_idx] // 2 if split else armies[start_idx] - 1
     defend_armies = armies[end_idx]
     is_attacking_same = owners[end_idx] == player
     captured_general = -1
 
+    if tracker is not None:
+        _tile_changing(tracker, start_idx, owners, armies, types)
+        _tile_changing(tracker, end_idx, owners, armies, types)
+
     armies[start_idx] -= attack_armies
 
     if is_attacking_same:
@@ -66,37 +448,182 @@ def _execute_move(move, owners, armies, types, height, width):
         else:
             armies[end_idx] = 0  # Ownership DOES not change
 
+    if tracker is not None:
+        _tile_changed(tracker, start_idx, owners, armies, types)
+        _tile_changed(tracker, end_idx, owners, armies, types)
+
     return captured_general
 
 
+@njit(cache=True)
+def _transfer_territory(owners, armies, types, captured_general, player, size, tracker=None):
+    if tracker is not None:
+        # Only visit the captured player's tiles. Each transfer unlinks the head of their list.
+        while tracker.tile_head[captured_general] != -1:
+            i = tracker.tile_head[captured_general]
+            _tile_changing(tracker, i, owners, armies, types)
+            owners[i] = player
+            armies[i] = (armies[i] + 1) // 2
+            _tile_changed(tracker, i, owners, armies, types)
+        return
+
+    for i in range(size):
+        if owners[i] == captured_general:
+            owners[i] = player
+            armies[i] = (armies[i] + 1) // 2
+
+
+@njit(cache=True)
+def _update_armies_flat(armies, types, owners, turn, size, tracker=None):
+    for i in range(size):
+        owner = owners[i]
+        if owner != -1:
+            tile_type = types[i]
+            new_armies = armies[i]
+            if turn % 50 == 0 and tile_type != TileType.DESERT.value:
+                new_armies += 1
+            if turn % 2 == 0:
+                if tile_type == TileType.GENERAL.value or tile_type == TileType.CITY.value:
+                    new_armies += 1
+            if tile_type == TileType.SWAMP.value:
+                new_armies = max(0, new_armies - 1)
+                if new_armies == 0:
+                    owner = -1
+            if new_armies != armies[i] or owner != owners[i]:
+                if tracker is not None:
+                    _tile_changing(tracker, i, owners, armies, types)
+                armies[i] = new_armies
+                owners[i] = owner
+                if tracker is not None:
+                    _tile_changed(tracker, i, owners, armies, types)
+
+
+@njit(cache=True)
+def _visibility_planes(vision_bits, lights, visible):
+    # visible[p, i] is True if tile i is visible to player p
+    for p in range(visible.shape[0]):
+        for i in range(vision_bits.size):
+            visible[p, i] = lights[i] or (vision_bits[i] >> p) & 1
+
+
+@njit(cache=True)
+def _merge_lights(vision_bits, lights, visibility):
+    # Lit tiles are visible to everyone
+    for i in range(vision_bits.size):
+        visibility[i] = np.uint32(0xFFFFFFFF) if lights[i] else vision_bits[i]
+
+
+@njit(cache=True)
+def _step_fused(moves, recent_moves, owners, armies, types, lights, height, width, turn, tracker, visibility):
+    size = height * width
+    _clear_changed_tiles(tracker)
+    for m in range(len(moves)):
+        recent_moves[m] = moves[m]
+        captured_general = _execute_move(moves[m], owners, armies, types, height, width, tracker)
+        if captured_general != -1:
+            _transfer_territory(owners, armies, types, captured_general, moves[m][0], size, tracker)
+    _update_armies_flat(armies, types, owners, turn, size, tracker)
+    _merge_lights(tracker.vision_bits, lights, visibility)
+
+
+@njit(parallel=True, cache=True)
+def _step_batch(moves, owners, armies, types, turns, priority_players, num_players, height, width):
+    size = height * width
+    for b in prange(moves.shape[0]):
+        for m in range(moves.shape[1]):
+            move = moves[b, m]
+            if move[0] < 0:  # Padding row, the rest of this game's moves are empty
+                break
+            captured_general = _execute_move(move, owners[b], armies[b], types[b], height, width)
+            if captured_general != -1:
+                _transfer_territory(owners[b], armies[b], types[b], captured_general, move[0], size)
+
+        priority_players[b] = (priority_players[b] + 1) % num_players
+        turns[b] += 1
+        _update_armies_flat(armies[b], types[b], owners[b], turns[b], size)
+
+
+def _game_rng(grid: Grid, rng) -> np.random.Generator:
+    return np.random.default_rng(rng) if rng is not None else grid.rng.spawn(1)[0]
+
+
+class GameSnapshot:
+    """
+    Copy of the mutable state of a LocalGame, including its tracker state. Snapshots own their buffers, so a
+    single snapshot can be refilled with LocalGame.snapshot(out=...) any number of times without allocating.
+    The static tables of the map (passable directions and lights) are never written, so they are referenced
+    rather than copied.
+    """
+    __slots__ = ("owners", "armies", "types", "turn", "priority_player", "tracker", "passable_dirs", "lights")
+
+    def __init__(self, game: 'LocalGame'):
+        self.owners = np.empty_like(game.owners_flat)
+        self.armies = np.empty_like(game.armies_flat)
+        self.types = np.empty_like(game.types_flat)
+        self.turn = 0
+        self.priority_player = 0
+        self.tracker = np.empty_like(_tracker_state_block(game.tracker))  # See TrackerState
+        self.passable_dirs = game.tracker.passable_dirs
+        self.lights = game.grid.lights
+
+
 class LocalGame:
-    def __init__(self, grid: Grid):
+    def __new__(cls, grid: Grid | None = None, *args, **kwargs):
+        # LocalGame(grid, backend=...) returns the game object of the selected backend, see genghis.game.backends.
+        # Subclasses have their own constructor arguments and are always numba games.
+        if cls is LocalGame:
+            backend = args[0] if args else kwargs.get("backend", "numba")
+            if backend != "numba":
+                return create_game(grid, backend, args[1] if len(args) > 1 else kwargs.get("rng"))
+        return super().__new__(cls)
+
+    def __init__(self, grid: Grid, backend: str = "numba", rng: np.random.Generator | None = None):
+        """
+        Args:
+            grid: The grid to play on. Its arrays are updated in place as the game is played.
+            backend: Engine to play with, see genghis.game.backends. This module needs numba, so on hosts
+                without it, create the game with genghis.game.backends.create_game(grid, backend) instead.
+            rng: Random generator, seed sequence or seed of the game. By default, a child stream of grid.rng is
+                used, so a game is fully determined by the grid's seed.
+        """
         self.grid = grid
+        self.rng = _game_rng(grid, rng)
         self._turn = 0
         self.height = grid.height
         self.width = grid.width
         self.num_players = grid.num_players
         self.max_moves_per_turn = self.height * self.width
-        self.moves_buffer = np.zeros((self.max_moves_per_turn, 6),
+        # Both move buffers start with room for a move of every player and grow when a turn or a move list needs it
+        self.moves_buffer = np.zeros((self.num_players, 6),
                                     dtype=np.int16)  # [player, start_y, start_x, end_y, end_x, split]
+        self.valid_moves_buffer = np.zeros((4 * self.num_players, 6), dtype=np.int16)
+        # make_move validates into its own rows, so it can be called while iterating generated moves
+        self._validation_buffer = np.zeros((4, 6), dtype=np.int16)
+        self.num_recent_moves = 0
         self.move_counts = np.zeros(self.num_players, dtype=np.int32)
-        self.adjacent_indices = _precompute_adjacents(self.height, self.width)
-        self.priority_player = random.randint(0, self.num_players - 1)
+        self.adjacent_indices = _shared_adjacents(self.height, self.width)
+        self.priority_player = int(self.rng.integers(self.num_players))
         self.owners_flat = self.grid.owners.ravel()
         self.armies_flat = self.grid.armies.ravel()
         self.types_flat = self.grid.types.ravel()
-        self.most_recent_start_move_squares = []
-        self.most_recent_end_move_squares = []
+        self.lights_flat = self.grid.lights.ravel()
+        self.visibility = np.zeros(self.height * self.width, dtype=np.uint32)
+        self._visible_buffer = None  # (num_players, height * width) masks of perspective, allocated on first use
+        self.tracker = _new_tracker(self.height * self.width, self.num_players,
+                                    _passable_directions(self.adjacent_indices, self.types_flat, self.width),
+                                    _vision_neighbourhoods(self.height, self.width))
+        _rebuild_tracker(self.tracker, self.owners_flat, self.armies_flat, self.types_flat)
+        self._undo_frames = []  # (undo_len, turn, priority_player, is_turn) for every recorded move or turn
 
     @staticmethod
-    @njit
+    @njit(cache=True)
     def _generate_and_validate_moves(player, start_coords, adjacent_indices,
                                     owners, armies, types, moves_buffer, height, width):
         move_count = 0
         n_starts = len(start_coords)
         idx_base = 0
 
-        for i in prange(n_starts):
+        for i in range(n_starts):  # Serial: every iteration appends at the shared move_count
             start_y, start_x = start_coords[i]
             idx_base = (start_y * width + start_x) * 4
             if owners[start_y * width + start_x] != player or armies[start_y * width + start_x] < 2:
@@ -109,107 +636,530 @@ class LocalGame:
                     move_count += 1
         return move_count
 
-    def generate_valid_moves(self, player):
+    @staticmethod
+    @njit(parallel=True, cache=True)
+    def _generate_and_validate_moves_parallel(player, start_coords, adjacent_indices,
+                                              owners, armies, types, moves_buffer, height, width):
+        # Count the moves of every start tile, take a prefix sum to get each tile's offset, then fill the buffer.
+        # Every tile writes its own slice, so the result is identical to the serial version.
+        n_starts = len(start_coords)
+        offsets = np.zeros(n_starts + 1, dtype=np.int64)
+
+        for i in prange(n_starts):
+            start_y, start_x = start_coords[i]
+            start_idx = start_y * width + start_x
+            if owners[start_idx] != player or armies[start_idx] < 2:
+                continue
+            count = 0
+            for j in range(4):
+                end_y, end_x = adjacent_indices[start_idx * 4 + j]
+                if end_y != -1 and types[end_y * width + end_x] != TileType.MOUNTAIN.value:
+                    count += 1
+            offsets[i + 1] = count
+
+        offsets = np.cumsum(offsets)
+
+        for i in prange(n_starts):
+            move_count = offsets[i]
+            if move_count == offsets[i + 1]:
+                continue
+            start_y, start_x = start_coords[i]
+            start_idx = start_y * width + start_x
+            for j in range(4):
+                end_y, end_x = adjacent_indices[start_idx * 4 + j]
+                if end_y != -1 and types[end_y * width + end_x] != TileType.MOUNTAIN.value:
+                    moves_buffer[move_count, 0] = player
+                    moves_buffer[move_count, 1] = start_y
+                    moves_buffer[move_count, 2] = start_x
+                    moves_buffer[move_count, 3] = end_y
+                    moves_buffer[move_count, 4] = end_x
+                    moves_buffer[move_count, 5] = 0
+                    move_count += 1
+        return offsets[n_starts]
+
+    def generate_valid_moves_array(self, player, parallel=None) -> np.ndarray:
+        """
+        Generate every valid move of a player without creating any Python objects.
+
+        Args:
+            player: Index of the player to generate moves for
+            parallel: Spread the work over all cores. The moves are the same and in the same order either way.
+                By default, the parallel generator is used once the player has PARALLEL_MOVE_GENERATION_THRESHOLD
+                tiles that can move.
+
+        Returns:
+            A (num_moves, 6) int16 view into the game's move generation buffer, with rows of
+            [player, start_y, start_x, end_y, end_x, split]. It is overwritten by the next call to a move generator
+            (but not by make_move), so copy any rows that have to outlive it. The array can be passed to
+            process_turn directly.
+        """
         owned = self.grid.owners == player
         enough_armies = self.grid.armies >= 2
         y_starts, x_starts = np.where(owned & enough_armies)
         start_coords = np.column_stack((y_starts, x_starts))
         if len(start_coords) == 0:
-            return []
+            return self.valid_moves_buffer[:0]
 
-        move_count = self._generate_and_validate_moves(
+        if parallel is None:
+            parallel = len(start_coords) >= PARALLEL_MOVE_GENERATION_THRESHOLD
+        self.valid_moves_buffer = _grow_rows(self.valid_moves_buffer, 4 * len(start_coords))
+        generate = self._generate_and_validate_moves_parallel if parallel else self._generate_and_validate_moves
+        move_count = generate(
             player, start_coords, self.adjacent_indices,
             self.owners_flat, self.armies_flat, self.types_flat,
-            self.moves_buffer, self.height, self.width
+            self.valid_moves_buffer, self.height, self.width
         )
+        return self.valid_moves_buffer[:move_count]
 
-        valid_moves = [Move(player, False, move[1], move[2], move[3], move[4])
-                       for move in self.moves_buffer[:move_count]]
-        return valid_moves
+    def legal_moves_array(self, player) -> np.ndarray:
+        """
+        Like generate_valid_moves_array, but read from the legal move set that is kept up to date as tiles change,
+        so the cost is proportional to the player's tiles instead of the board. The moves are the same, but in
+        no particular order.
+        """
+        self.valid_moves_buffer = _grow_rows(self.valid_moves_buffer, 4 * self.tracker.tile_count[player])
+        move_count = _expand_legal_moves(player, self.tracker, self.adjacent_indices, self.valid_moves_buffer,
+                                         self.width)
+        return self.valid_moves_buffer[:move_count]
 
-    def make_move(self, start_y, start_x, end_y, end_x, player, split):
+    def legal_move_count(self, player) -> int:
+        return int(self.tracker.legal_count[player])
+
+    def legal_move_mask(self) -> np.ndarray:
+        """
+        Return a (height, width) uint8 view of the legal move directions of every tile. Bit j is set if the owner
+        of the tile can move from it towards its j-th neighbour, in the order up, right, down, left.
+        """
+        return self.tracker.legal_dirs.reshape(self.height, self.width)
+
+    def generate_valid_moves(self, player):
+        return [Move(player, False, move[1], move[2], move[3], move[4])
+                for move in self.generate_valid_moves_array(player)]
+
+    def make_move(self, start_y, start_x, end_y, end_x, player, split, record=False):
         move = np.array([player, start_y, start_x, end_y, end_x, split], dtype=np.int16)
         if not self._generate_and_validate_moves(player, np.array([[start_y, start_x]]),
                                                  self.adjacent_indices, self.owners_flat,
                                                  self.armies_flat, self.types_flat,
-                                                 self.moves_buffer, self.height, self.width):
+                                                 self._validation_buffer, self.height, self.width):
             return False
 
+        if record:
+            self._begin_undo_frame(move[np.newaxis], False)
         captured_general = _execute_move(move, self.owners_flat, self.armies_flat,
-                                        self.types_flat, self.height, self.width)
+                                        self.types_flat, self.height, self.width, self.tracker)
 
         if captured_general != -1:
-            mask = self.owners_flat == captured_general
-            self.owners_flat[mask] = player
-            self.armies_flat[mask] = (self.armies_flat[mask] + 1) // 2
+            _transfer_territory(self.owners_flat, self.armies_flat, self.types_flat, captured_general, player,
+                                self.height * self.width, self.tracker)
+        self.tracker.recording[0] = False
         return True
 
-    @staticmethod
-    @njit
-    def _update_armies_flat(armies, types, owners, turn, size):
-        for i in prange(size):
-            owner = owners[i]
-            if owner != -1:
-                tile_type = types[i]
-                if turn % 50 == 0 and tile_type != TileType.DESERT.value:
-                    armies[i] += 1
-                if turn % 2 == 0:
-                    if tile_type == TileType.GENERAL.value or tile_type == TileType.CITY.value:
-                        armies[i] += 1
-                if tile_type == TileType.SWAMP.value:
-                    armies[i] = max(0, armies[i] - 1)
-                    if armies[i] == 0:
-                        owners[i] = -1
+    def _begin_undo_frame(self, moves, is_turn):
+        """
+        Start recording the tiles touched by a move or turn, growing the undo log if it could overflow.
+
+        Args:
+            moves: (num_moves, 6) array of the moves about to be executed
+            is_turn: Whether army growth follows the moves
+        """
+        undo_len = self.tracker.undo_len[0]
+        # Only owned tiles grow or decay, and each move adds at most one of them
+        owned = int(self.tracker.tile_count.sum()) + len(moves)
+        # Every move logs its two tiles and army growth every owned tile
+        needed = undo_len + 2 * len(moves) + (owned if is_turn else 0)
+        if len(moves):
+            ends = moves[:, 3].astype(np.int64) * self.width + moves[:, 4]
+            attacks = (self.types_flat[ends] == TileType.GENERAL.value) & (self.owners_flat[ends] != moves[:, 0])
+            if attacks.any():  # Each general capture logs every tile of the captured player
+                needed += min(int(np.count_nonzero(attacks)), self.num_players - 1) * owned
+        if needed > len(self.tracker.undo_index):
+            capacity = max(needed, 2 * len(self.tracker.undo_index))
+            columns = {}
+            for field in ("undo_index", "undo_owner", "undo_army", "undo_type"):
+                column = getattr(self.tracker, field)
+                columns[field] = np.empty(capacity, dtype=column.dtype)
+                columns[field][:undo_len] = column[:undo_len]
+            self.tracker = self.tracker._replace(**columns)
+        self._undo_frames.append((undo_len, self._turn, self.priority_player, is_turn))
+        self.tracker.recording[0] = True
+
+    def _pop_undo_frame(self, is_turn):
+        assert self._undo_frames and self._undo_frames[-1][3] == is_turn, \
+            f"The last recorded action is not a {'turn' if is_turn else 'move'}."
+        undo_len, self._turn, self.priority_player, _ = self._undo_frames.pop()
+        _undo_tiles(self.tracker, undo_len, self.owners_flat, self.armies_flat, self.types_flat)
+
+    def unmake_move(self):
+        """
+        Roll back the last move made with make_move(..., record=True). Costs O(tiles the move changed).
+        """
+        self._pop_undo_frame(False)
+
+    def unmake_turn(self):
+        """
+        Roll back the last turn processed with process_turn(..., record=True), including army growth.
+        """
+        self._pop_undo_frame(True)
+
+    def clear_undo_log(self):
+        """
+        Forget every recorded move and turn.
+        """
+        self._undo_frames.clear()
+        self.tracker.undo_len[0] = 0
+
+    def snapshot(self, out: GameSnapshot | None = None) -> GameSnapshot:
+        """
+        Copy the current state into a snapshot.
+
+        Args:
+            out: Snapshot to overwrite. A new one is allocated if None.
+
+        Returns:
+            The filled snapshot
+        """
+        if out is None:
+            out = GameSnapshot(self)
+        np.copyto(out.owners, self.owners_flat)
+        np.copyto(out.armies, self.armies_flat)
+        np.copyto(out.types, self.types_flat)
+        out.turn = self._turn
+        out.priority_player = self.priority_player
+        np.copyto(out.tracker, _tracker_state_block(self.tracker))
+        out.passable_dirs = self.tracker.passable_dirs
+        out.lights = self.grid.lights
+        return out
+
+    def _use_map_tables(self, passable_dirs, lights):
+        # Switch to the static tables of another map of the same shape, when restoring or forking from it
+        if passable_dirs is not self.tracker.passable_dirs:
+            self.tracker = self.tracker._replace(passable_dirs=passable_dirs)
+        if lights is not self.grid.lights:
+            self.grid.lights = lights
+            self.lights_flat = lights.ravel()
+
+    def set_board(self, owners, armies, types, turn, priority_player):
+        """
+        Overwrite the state with flat owners, armies and types arrays and rebuild the tracker from them, in
+        O(tiles). Unlike restore, the arrays don't need a matching tracker state, e.g. they can be edited copies.
+        The lights are kept.
+        """
+        np.copyto(self.owners_flat, owners)
+        np.copyto(self.armies_flat, armies)
+        np.copyto(self.types_flat, types)
+        self._turn = turn
+        self.priority_player = priority_player
+        # The mountains may differ from the current ones
+        self.tracker = self.tracker._replace(
+            passable_dirs=_passable_directions(self.adjacent_indices, self.types_flat, self.width))
+        _rebuild_tracker(self.tracker, self.owners_flat, self.armies_flat, self.types_flat)
+        self.clear_undo_log()
+
+    def restore(self, snapshot: GameSnapshot):
+        """
+        Reset the game to a snapshot previously taken from it (or from a game of the same shape). The tracker
+        state stored in the snapshot is copied back, so nothing is recomputed.
+        """
+        np.copyto(self.owners_flat, snapshot.owners)
+        np.copyto(self.armies_flat, snapshot.armies)
+        np.copyto(self.types_flat, snapshot.types)
+        self._turn = snapshot.turn
+        self.priority_player = snapshot.priority_player
+        np.copyto(_tracker_state_block(self.tracker), snapshot.tracker)
+        self._use_map_tables(snapshot.passable_dirs, snapshot.lights)
+        _reset_changed_tiles(self.tracker)
+        self.clear_undo_log()
+
+    def fork(self, into: 'LocalGame | None' = None) -> 'LocalGame':
+        """
+        Copy this game's state into another game object. Neither Grid.__init__ nor the adjacency precomputation
+        is rerun: the new game shares the (read-only) adjacency table and only the state arrays are copied. A new
+        game gets child streams of the parent's random generators, a pooled game keeps its own.
+
+        Args:
+            into: A game of the same shape to overwrite, e.g. one taken from a GamePool. A new game is
+                created if None.
+
+        Returns:
+            The forked game
+        """
+        if into is None:
+            into = copy.copy(self)
+            into.grid = copy.copy(self.grid)
+            # Child streams, so the fork and its parent never draw the same numbers
+            into.rng = self.rng.spawn(1)[0]
+            into.grid.rng = self.grid.rng.spawn(1)[0]
+            into.grid.owners, into.grid.types = pack_tiles(self.grid.owners, self.grid.types)
+            into.grid.armies = self.grid.armies.copy()
+            into.owners_flat = into.grid.owners.ravel()
+            into.armies_flat = into.grid.armies.ravel()
+            into.types_flat = into.grid.types.ravel()
+            into.moves_buffer = self.moves_buffer.copy()
+            into.valid_moves_buffer = np.zeros_like(self.valid_moves_buffer)
+            into._validation_buffer = np.zeros_like(self._validation_buffer)
+            into.move_counts = np.zeros_like(self.move_counts)
+            into.visibility = np.zeros_like(self.visibility)
+            into._visible_buffer = None
+            into.tracker = _new_tracker(self.height * self.width, self.num_players, self.tracker.passable_dirs,
+                                        self.tracker.vision_neighbours)
+            into._undo_frames = []
+        else:
+            np.copyto(into.owners_flat, self.owners_flat)
+            np.copyto(into.armies_flat, self.armies_flat)
+            np.copyto(into.types_flat, self.types_flat)
+            into._turn = self._turn
+            into.priority_player = self.priority_player
+            into.moves_buffer = _grow_rows(into.moves_buffer, self.num_recent_moves)
+            into.moves_buffer[:self.num_recent_moves] = self.moves_buffer[:self.num_recent_moves]
+            into.clear_undo_log()
+            _reset_changed_tiles(into.tracker)
+            into._use_map_tables(self.tracker.passable_dirs, self.grid.lights)
+        into.num_recent_moves = self.num_recent_moves
+        np.copyto(_tracker_state_block(into.tracker), _tracker_state_block(self.tracker))
+        return into
+
+    @property
+    def zobrist_hash(self) -> int:
+        """
+        64-bit Zobrist hash of the owner, type and army bucket of every tile, the turn parity and the priority
+        player. It is updated incrementally as tiles change, so reading it is O(1).
+        """
+        _, _, _, turn_keys, priority_keys = _zobrist_keys(self.height * self.width, self.num_players)
+        return int(self.tracker.zobrist_hash[0] ^ turn_keys[self._turn & 1] ^ priority_keys[self.priority_player])
+
+    def owned_tiles(self, player) -> np.ndarray:
+        """
+        Return a new int32 array of the flat indices of every tile owned by player, in no particular order. It is
+        read from the tile index, so it costs O(tiles owned by player).
+        """
+        tiles = np.empty(self.tracker.tile_count[player], dtype=np.int32)
+        _list_tiles(self.tracker, player, tiles)
+        return tiles
+
+    def land_count(self, player) -> int:
+        return int(self.tracker.tile_count[player])
+
+    def army_count(self, player) -> int:
+        return int(self.tracker.army_count[player])
+
+    def city_count(self, player) -> int:
+        return int(self.tracker.city_count[player])
+
+    def is_eliminated(self, player) -> bool:
+        return self.tracker.tile_count[player] == 0
+
+    def player_scores(self) -> list[dict]:
+        """
+        Return the scoreboard in the same format as the generals.io game_update "scores" field, which OnlineGame
+        stores in its scores attribute. The statistics are maintained incrementally, so this is O(players).
+        """
+        return [{"i": player,
+                 "total": int(self.tracker.army_count[player]),
+                 "tiles": int(self.tracker.tile_count[player]),
+                 "dead": bool(self.tracker.tile_count[player] == 0)}
+                for player in range(self.num_players)]
+
+    def nbytes(self, detailed=False) -> int | dict[str, int]:
+        """
+        Memory held by this game, to work out how many games fit on a host. The adjacency table, the vision
+        neighbourhoods and the Zobrist keys are shared by every game of the same shape and are not counted. The
+        lights and passable directions of the map are shared by its forks and snapshots, so they are reported
+        separately and left out of the total, which can be summed over games.
+
+        Args:
+            detailed: Return the bytes of each part of the game instead of the total
+
+        Returns:
+            The total number of bytes, or a dict with the bytes of the "state" (grid arrays), the "buffers" (move
+            buffers and visibility), the "tracker" (undo log, tile index, stats and legal moves) and the "map"
+            (lights and passable directions, not part of the total)
+        """
+        parts = {
+            "state": [self.grid.owners, self.grid.armies, self.grid.types],
+            "buffers": [array for array in (self.moves_buffer, self.valid_moves_buffer, self._validation_buffer,
+                                            self.move_counts, self.visibility, self._visible_buffer)
+                        if array is not None],
+            "tracker": [array for field, array in zip(self.tracker._fields, self.tracker)
+                        if field not in ("zobrist_owner", "zobrist_type", "zobrist_army", "vision_neighbours",
+                                         "passable_dirs")],
+            "map": [self.grid.lights, self.tracker.passable_dirs],
+        }
+        sizes = {part: sum(array.nbytes for array in _root_arrays(arrays)) for part, arrays in parts.items()}
+        return sizes if detailed else sum(size for part, size in sizes.items() if part != "map")
 
     def update_armies(self):
-        self._update_armies_flat(self.armies_flat, self.types_flat, self.owners_flat,
-                                 self._turn, self.height * self.width)
+        _update_armies_flat(self.armies_flat, self.types_flat, self.owners_flat,
+                            self._turn, self.height * self.width, self.tracker)
 
     @staticmethod
-    @njit
-    def _process_turn_internal(moves_buffer, move_counts, num_players, owners, armies, types, height, width):
+    @njit(cache=True)
+    def _process_turn_internal(moves_buffer, move_counts, num_players, owners, armies, types, height, width,
+                               tracker=None):
         total_moves = np.sum(move_counts)
         current_move_idx = 0
+        if tracker is not None:
+            _clear_changed_tiles(tracker)
 
         for player in range(num_players):
             for _ in range(move_counts[player]):
                 if current_move_idx < total_moves:
                     captured_general = _execute_move(moves_buffer[current_move_idx], owners, armies, types, height,
-                                                    width)
+                                                    width, tracker)
                     if captured_general != -1:
-                        for i in prange(height * width):
-                            if owners[i] == captured_general:
-                                owners[i] = moves_buffer[current_move_idx][0]
-                                armies[i] = (armies[i] + 1) // 2
+                        _transfer_territory(owners, armies, types, captured_general,
+                                            moves_buffer[current_move_idx][0], height * width, tracker)
                     current_move_idx += 1
 
-    def process_turn(self, moves=None):
+    def process_turn(self, moves=None, record=False):
+        """
+        Execute one turn.
+
+        Args:
+            moves: Either a list of Move objects, an ActionBatch or a (num_moves, 6) integer array with rows of
+                [player, start_y, start_x, end_y, end_x, split], e.g. rows of generate_valid_moves_array.
+                Moves are executed in order and passes are skipped.
+            record: Record the turn in the undo log so it can be rolled back with unmake_turn
+
+        Returns:
+            The flat indices of the tiles that changed during the turn, see changed_tiles
+        """
         if moves is None:
             moves = []
+        elif isinstance(moves, ActionBatch):
+            moves = moves.to_moves()
 
         self.move_counts.fill(0)
         total_moves = 0
-        self.most_recent_start_move_squares = []
-        self.most_recent_end_move_squares = []
+        self.moves_buffer = _grow_rows(self.moves_buffer, min(len(moves), self.max_moves_per_turn))
 
-        for i, move in enumerate(moves):
-            if i >= self.max_moves_per_turn:
-                break
-            player = move.player_index
-            self.moves_buffer[i] = [player, move.start[0], move.start[1],
-                                   move.end[0], move.end[1], move.split]
-            self.move_counts[player] += 1
-            total_moves += 1
-            self.most_recent_start_move_squares.append((move.start[0], move.start[1]))
-            self.most_recent_end_move_squares.append((move.end[0], move.end[1]))
+        if isinstance(moves, np.ndarray):
+            total_moves = min(len(moves), self.max_moves_per_turn)
+            self.moves_buffer[:total_moves] = moves[:total_moves]
+            self.move_counts += np.bincount(self.moves_buffer[:total_moves, 0], minlength=self.num_players)
+        else:
+            for move in moves:
+                if total_moves >= self.max_moves_per_turn:
+                    break
+                if move.is_pass:
+                    continue
+                player = move.player_index
+                self.moves_buffer[total_moves] = [player, move.start[0], move.start[1],
+                                                 move.end[0], move.end[1], move.split]
+                self.move_counts[player] += 1
+                total_moves += 1
+        self.num_recent_moves = total_moves
+        if record:
+            self._begin_undo_frame(self.moves_buffer[:total_moves], True)
 
         self._process_turn_internal(self.moves_buffer, self.move_counts,
                                    self.num_players, self.owners_flat, self.armies_flat,
-                                   self.types_flat, self.height, self.width)
+                                   self.types_flat, self.height, self.width, self.tracker)
 
         self.priority_player = (self.priority_player + 1) % self.num_players
         self._turn += 1
         self.update_armies()
+        self.tracker.recording[0] = False
+        return self.changed_tiles()
+
+    def step_fused(self, moves: np.ndarray | None = None, record=False) -> np.ndarray:
+        """
+        Same as process_turn with an array of moves, but the moves, army growth and swamp decay are all processed
+        by a single compiled call, which also returns the vision of every player.
+
+        Args:
+            moves: (num_moves, 6) int16 array with rows of [player, start_y, start_x, end_y, end_x, split], or an
+                ActionBatch
+            record: Record the turn in the undo log so it can be rolled back with unmake_turn
+
+        Returns:
+            A (height * width) uint32 array where bit p of each tile is set if it is visible to player p. It is
+            reused by the next call.
+        """
+        if moves is None:
+            moves = _NO_MOVES
+        elif isinstance(moves, ActionBatch):
+            moves = moves.to_moves()
+        self.num_recent_moves = min(len(moves), self.max_moves_per_turn)
+        if record:
+            self._begin_undo_frame(moves[:self.num_recent_moves], True)
+        self.moves_buffer = _grow_rows(self.moves_buffer, self.num_recent_moves)
+        self.priority_player = (self.priority_player + 1) % self.num_players
+        self._turn += 1
+        _step_fused(moves[:self.num_recent_moves], self.moves_buffer, self.owners_flat, self.armies_flat,
+                    self.types_flat, self.lights_flat, self.height, self.width, self._turn, self.tracker,
+                    self.visibility)
+        self.tracker.recording[0] = False
+        return self.visibility
+
+    def visible_mask(self, player, visibility: np.ndarray | None = None) -> np.ndarray:
+        """
+        Return a (height, width) boolean mask of the tiles visible to player. By default, it is read from the
+        vision bits that are kept up to date as tiles change owner, so it costs O(tiles) without any filtering.
+
+        Args:
+            player: Index of the player
+            visibility: A bitmask returned by step_fused to read instead
+        """
+        if visibility is None:
+            return (((self.tracker.vision_bits >> player) & 1).astype(bool) | self.lights_flat).reshape(
+                self.height, self.width)
+        return ((visibility >> player) & 1).astype(bool).reshape(self.height, self.width)
+
+    def perspective(self, out: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None):
+        """
+        Compute what every player sees, see Grid.perspective. The visibility comes from the vision bits that
+        are kept up to date as tiles change owner, so no vision is recomputed. The visibility masks are written into
+        a buffer of the game, so nothing is allocated when out is given.
+
+        Args:
+            out: (owners, armies, types) arrays of shape (num_players, height, width) to write into
+
+        Returns:
+            The (owners, armies, types) perspective of every player
+        """
+        if self._visible_buffer is None:
+            self._visible_buffer = np.empty((self.num_players, self.height * self.width), dtype=bool)
+        _visibility_planes(self.tracker.vision_bits, self.lights_flat, self._visible_buffer)
+        return self.grid.perspective(self._visible_buffer.reshape(self.num_players, self.height, self.width), out)
+
+    def observation_tensors(self, pad_to: int | None = None, out: np.ndarray | None = None, dtype=np.float64):
+        """
+        Encode the observation of every player into one tensor, see observation.encode_perspectives. It is built
+        from the perspective and the tracked land and army counts, without any Observation objects.
+
+        Args:
+            pad_to: Size of the square tensor, the board size by default
+            out: Buffer of shape (num_players, 15, rows, cols) to write into
+            dtype: dtype of the new tensor, ignored when out is given
+
+        Returns:
+            The tensor, i.e. out if it was given
+        """
+        owners, armies, types = self.perspective()
+        return encode_perspectives(owners, armies, types, self.tracker.tile_count[:self.num_players],
+                                   self.tracker.army_count[:self.num_players], self._turn, self.priority_player,
+                                   pad_to, out, dtype)
+
+    def changed_tiles(self) -> np.ndarray:
+        """
+        Return the flat indices of the tiles changed since the start of the last process_turn or step_fused,
+        including moves made with make_move or undone since then. A tile is included if its owner, armies or type
+        changed, or if it became visible or hidden to any player, so observations can be updated from these
+        tiles alone. Each tile appears once, in no particular order.
+
+        Returns:
+            An int32 view that is overwritten by the next turn. Restoring or forking a game clears it.
+        """
+        return self.tracker.changed_tiles[:self.tracker.changed_len[0]]
+
+    @property
+    def most_recent_start_move_squares(self):
+        return [(int(y), int(x)) for y, x in self.moves_buffer[:self.num_recent_moves, 1:3]]
+
+    @property
+    def most_recent_end_move_squares(self):
+        return [(int(y), int(x)) for y, x in self.moves_buffer[:self.num_recent_moves, 3:5]]
 
     def _format_tile(self, y, x):
         owner = self.grid.owners[y, x]
@@ -243,14 +1193,16 @@ class LocalGame:
         print(col_header)
 
         return_value = ""
+        start_squares = self.most_recent_start_move_squares
+        end_squares = self.most_recent_end_move_squares
         for y, row in enumerate(grid):
             def l(x, item):
                 return col_widths[x] + (len(item) - len(replace_ansi(item)))
 
             def get_square_effect(y, x):
-                if (y, x) in self.most_recent_start_move_squares:
+                if (y, x) in start_squares:
                     return EFFECT_RECENT_MOVE_START_POSITION
-                elif (y, x) in self.most_recent_end_move_squares:
+                elif (y, x) in end_squares:
                     return EFFECT_RECENT_MOVE_END_POSITION
                 return ""
 
@@ -295,7 +1247,7 @@ class LocalGame:
 
     def benchmark(self, num_turns=100, seed=42, display_every=None):
         print(f"\nRunning benchmark for {num_turns} turns with seed {seed}...")
-        np.random.seed(seed)
+        rng = np.random.default_rng(seed)
 
         start_time = time.time()
         total_moves = 0
@@ -306,18 +1258,18 @@ class LocalGame:
         print(f"Move generation for {self.num_players} players ({total_moves} moves): {move_gen_time:.4f} seconds")
 
         start_time = time.time()
+        moves = np.zeros((self.num_players, 6), dtype=np.int16)
         for turn in range(num_turns):
             if display_every is not None and turn % display_every == 0:
                 print("\x1b[A" * 27)
                 self.display_board()
-            moves = []
+            num_moves = 0
             for player in range(self.num_players):
-                player_moves = self.generate_valid_moves(player)
-                if player_moves:
-                    random_move = np.random.randint(0, len(player_moves))
-                    moves.append(player_moves[random_move])
-                    print(player_moves[random_move])
-            self.process_turn(moves)
+                player_moves = self.generate_valid_moves_array(player)
+                if len(player_moves):
+                    moves[num_moves] = player_moves[rng.integers(len(player_moves))]
+                    num_moves += 1
+            self.process_turn(moves[:num_moves])
         turn_process_time = time.time() - start_time
         print(f"Processed {num_turns} turns: {turn_process_time:.4f} seconds")
         print(f"Average time per turn: {turn_process_time / num_turns:.6f} seconds")
@@ -325,6 +1277,222 @@ class LocalGame:
         return move_gen_time, turn_process_time
 
 
+class GamePool:
+    """
+    Free list of game objects for search. Forking into a pooled game only copies the state arrays, so
+    branching the game costs a few microseconds once the pool is warm.
+    """
+
+    def __init__(self):
+        self._free: list[LocalGame] = []
+
+    def fork(self, game: LocalGame) -> LocalGame:
+        """
+        Return a copy of game, reusing a released game object if one is available.
+        """
+        if self._free:
+            return game.fork(into=self._free.pop())
+        return game.fork()
+
+    def release(self, game: LocalGame):
+        """
+        Give a forked game back to the pool. It must not be used afterward.
+        """
+        self._free.append(game)
+
+
+class BatchedLocalGame:
+    """
+    Steps many games of the same shape at once. The state of every game lives in stacked (B, height * width)
+    arrays and a whole batch is processed by a single compiled call, so the cost of a step scales with the
+    number of tiles instead of the Python overhead of each game.
+    """
+
+    def __init__(self, grids: list[Grid]):
+        """
+        Args:
+            grids: The grids to play on. All of them must share the same dimensions and number of players. Their
+                arrays are copied into the batch and then pointed at their game's row, so they follow the game.
+        """
+        assert len(grids) > 0, "At least one grid is required."
+        self.height = grids[0].height
+        self.width = grids[0].width
+        self.num_players = grids[0].num_players
+        for grid in grids:
+            assert (grid.height, grid.width) == (self.height, self.width), "All grids must have the same dimensions."
+            assert grid.num_players == self.num_players, "All grids must have the same number of players."
+
+        self.batch_size = len(grids)
+        self.grids = list(grids)
+        self.adjacent_indices = _shared_adjacents(self.height, self.width)
+        self.owners = np.stack([grid.owners.ravel() for grid in grids])
+        self.armies = np.stack([grid.armies.ravel() for grid in grids])
+        self.types = np.stack([grid.types.ravel() for grid in grids])
+        self.turns = np.zeros(self.batch_size, dtype=np.int32)
+        self.priority_players = np.array([_game_rng(grid, None).integers(self.num_players) for grid in grids],
+                                         dtype=np.int32)
+        for index, grid in enumerate(grids):
+            grid.owners, grid.armies, grid.types = self.game_state(index)
+
+    def reset_game(self, index: int, grid: Grid):
+        """
+        Replace a single game of the batch (e.g. one that has finished) with a fresh one.
+
+        Args:
+            index: Index of the game in the batch
+            grid: The grid for the new game, with the same dimensions and number of players as the batch
+        """
+        assert (grid.height, grid.width) == (self.height, self.width), "Grid must have the batch's dimensions."
+        assert grid.num_players == self.num_players, "Grid must have the batch's number of players."
+        # The replaced grid keeps the final state of its game instead of following the new one
+        finished = self.grids[index]
+        finished.owners, finished.armies, finished.types = (array.copy() for array in self.game_state(index))
+        self.grids[index] = grid
+        self.owners[index] = grid.owners.ravel()
+        self.armies[index] = grid.armies.ravel()
+        self.types[index] = grid.types.ravel()
+        self.turns[index] = 0
+        self.priority_players[index] = _game_rng(grid, None).integers(self.num_players)
+        grid.owners, grid.armies, grid.types = self.game_state(index)
+
+    def step(self, moves: np.ndarray):
+        """
+        Process one turn for every game in the batch.
+
+        Args:
+            moves: Array of shape (batch_size, max_moves, 6) with rows of [player, start_y, start_x, end_y, end_x,
+                split]. Each game's moves are executed in order; unused rows at the end are padded with player -1.
+                Like LocalGame.process_turn, moves are not validated.
+        """
+        moves = np.asarray(moves, dtype=np.int16)
+        assert moves.ndim == 3 and moves.shape[0] == self.batch_size and moves.shape[2] == 6, \
+            "moves must have shape (batch_size, max_moves, 6)."
+        _step_batch(moves, self.owners, self.armies, self.types, self.turns, self.priority_players,
+                    self.num_players, self.height, self.width)
+
+    def game_state(self, index: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (owners, armies, types) of a single game as (height, width) views into the batch arrays.
+        """
+        shape = (self.height, self.width)
+        return self.owners[index].reshape(shape), self.armies[index].reshape(shape), self.types[index].reshape(shape)
+
+
+class BatchedBackendGame:
+    """
+    LocalGame interface on top of a BatchedLocalGame that holds a single game, so that the batched kernel can be
+    selected with LocalGame(grid, backend="batched") and checked against the other backends.
+    """
+
+    # Move generation and display only need the grid, the flat state and the buffers, so they are shared with LocalGame
+    _generate_and_validate_moves = staticmethod(LocalGame._generate_and_validate_moves)
+    _generate_and_validate_moves_parallel = staticmethod(LocalGame._generate_and_validate_moves_parallel)
+    generate_valid_moves_array = LocalGame.generate_valid_moves_array
+    generate_valid_moves = LocalGame.generate_valid_moves
+    _format_tile = LocalGame._format_tile
+    _get_formatted_grid = LocalGame._get_formatted_grid
+    display_board = LocalGame.display_board
+
+    def __init__(self, grid: Grid, rng: np.random.Generator | None = None):
+        self.grid = grid
+        self.height = grid.height
+        self.width = grid.width
+        self.num_players = grid.num_players
+        self.batch = BatchedLocalGame([grid])
+        if rng is not None:
+            self.priority_player = int(np.random.default_rng(rng).integers(self.num_players))
+        self.adjacent_indices = self.batch.adjacent_indices
+        self.owners_flat = self.batch.owners[0]
+        self.armies_flat = self.batch.armies[0]
+        self.types_flat = self.batch.types[0]
+        self.valid_moves_buffer = np.zeros((4 * self.num_players, 6), dtype=np.int16)
+        self._validation_buffer = np.zeros((4, 6), dtype=np.int16)
+        self.recent_moves = _NO_MOVES
+
+    @property
+    def _turn(self) -> int:
+        return int(self.batch.turns[0])
+
+    @property
+    def priority_player(self) -> int:
+        return int(self.batch.priority_players[0])
+
+    @priority_player.setter
+    def priority_player(self, player: int):
+        self.batch.priority_players[0] = player
+
+    @property
+    def most_recent_start_move_squares(self):
+        return [(int(y), int(x)) for y, x in self.recent_moves[:, 1:3]]
+
+    @property
+    def most_recent_end_move_squares(self):
+        return [(int(y), int(x)) for y, x in self.recent_moves[:, 3:5]]
+
+    def make_move(self, start_y, start_x, end_y, end_x, player, split):
+        if not self._generate_and_validate_moves(player, np.array([[start_y, start_x]]),
+                                                 self.adjacent_indices, self.owners_flat,
+                                                 self.armies_flat, self.types_flat,
+                                                 self._validation_buffer, self.height, self.width):
+            return False
+
+        move = np.array([player, start_y, start_x, end_y, end_x, split], dtype=np.int16)
+        captured_general = _execute_move(move, self.owners_flat, self.armies_flat, self.types_flat,
+                                         self.height, self.width)
+        if captured_general != -1:
+            _transfer_territory(self.owners_flat, self.armies_flat, self.types_flat, captured_general, player,
+                                self.height * self.width)
+        return True
+
+    def process_turn(self, moves=None):
+        """
+        Execute one turn, see LocalGame.process_turn.
+        """
+        if moves is None:
+            moves = _NO_MOVES
+        elif isinstance(moves, ActionBatch):
+            moves = moves.to_moves()
+        elif not isinstance(moves, np.ndarray):
+            moves = np.array([[move.player_index, move.start[0], move.start[1], move.end[0], move.end[1],
+                               move.split] for move in moves if not move.is_pass], dtype=np.int16).reshape(-1, 6)
+        self.recent_moves = np.array(moves, dtype=np.int16)
+        self.batch.step(self.recent_moves[np.newaxis])
+
+
+def warmup() -> float:
+    """
+    Compile every kernel of the engine for the dtypes used by Grid, LocalGame and BatchedLocalGame. Kernels are
+    cached on disk, so this only compiles once per machine and later processes just load them. Call it in a parent
+    process before forking self-play workers so every worker starts with compiled kernels.
+
+    Returns:
+        The number of seconds it took
+    """
+    start_time = time.perf_counter()
+    grid = Grid(width=4, height=4, players=2, uniform_city_density=0, uniform_mountain_density=0, seed=0)
+    batch = BatchedLocalGame([grid])
+    game = LocalGame(grid)
+    armies = game.armies_flat.copy()
+    armies[game.owned_tiles(0)] = 10
+    # Through set_board so the tracker sees the armies, restore and fork copy it rather than rebuild it
+    game.set_board(game.owners_flat, armies, game.types_flat, game._turn, game.priority_player)
+    game.fork(into=game.fork())
+    game.restore(game.snapshot())
+
+    for player in range(game.num_players):
+        game.generate_valid_moves_array(player, parallel=True)
+        game.generate_valid_moves_array(player, parallel=False)
+    moves = game.legal_moves_array(0)[:1].copy()
+    game.make_move(*moves[0, 1:5], 0, 0, record=True)
+    game.unmake_move()
+    game.process_turn(moves, record=True)
+    game.unmake_turn()
+    game.step_fused(moves)
+    game.perspective()
+    batch.step(moves[np.newaxis])
+    return time.perf_counter() - start_time
+
+
 class OnlineGame(LocalGame):
     """
     Online game. Basically just patches data and creates observations from data into the internal Grid class.
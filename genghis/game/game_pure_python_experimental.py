@@ -1,9 +1,10 @@
-import random
 import time
+import numpy as np
 import re
 from enum import Enum
 from __init__ import EFFECT_DISABLE_RECENT_MOVE, EFFECT_RECENT_MOVE_END_POSITION, EFFECT_RECENT_MOVE_START_POSITION, \
     PLAYER_COLORS_HEX, TileType
+from genghis.game.action import ActionBatch
 from genghis.game.move import Move
 from grid import Grid
 
@@ -36,17 +37,11 @@ def precompute_adjacents(height, width):
 
 
 def execute_move(move, owners, armies, types, height, width):
-    player, start_x, start_y, end_x, end_y, split = move
+    # Same rules as game._execute_move, which is the reference. Moves are not validated.
+    player, start_y, start_x, end_y, end_x, split = move
     start_idx = start_y * width + start_x
     end_idx = end_y * width + end_x
 
-    # Validate move
-    if (armies[start_idx] < 2 or
-            start_x < 0 or start_x >= width or start_y < 0 or start_y >= height or
-            end_x < 0 or end_x >= width or end_y < 0 or end_y >= height):
-        print(f"Invalid move: {move}, armies={armies[start_idx]}, grid bounds={width}x{height}")
-        return -1
-
     attack_armies = armies[start_idx] // 2 if split else armies[start_idx] - 1
     defend_armies = armies[end_idx]
     is_attacking_same = owners[end_idx] == player
@@ -66,100 +61,95 @@ def execute_move(move, owners, armies, types, height, width):
         elif attack_armies < defend_armies:
             armies[end_idx] = defend_armies - attack_armies
         else:
-            armies[end_idx] = 0
-            owners[end_idx] = player
+            armies[end_idx] = 0  # Ownership DOES not change
 
     return captured_general
 
 
-class LocalGame:
-    def __init__(self, grid: Grid):
+def transfer_territory(owners, armies, captured_general, player):
+    for i in range(len(owners)):
+        if owners[i] == captured_general:
+            owners[i] = player
+            armies[i] = (armies[i] + 1) // 2
+
+
+class PythonLocalGame:
+    """
+    Pure Python backend of LocalGame, for hosts where numba is not available. The state is kept in Python lists,
+    which are faster than numpy arrays for scalar loops, and copied to the grid after every change.
+    """
+
+    def __init__(self, grid: Grid, rng: np.random.Generator | None = None):
         self.grid = grid
+        self.rng = np.random.default_rng(rng) if rng is not None else grid.rng.spawn(1)[0]
         self._turn = 0
         self.height = grid.height
         self.width = grid.width
         self.num_players = grid.num_players
-        self.move_counts = [0] * self.num_players
         self.adjacent_indices = precompute_adjacents(self.height, self.width)
-        self.priority_player = random.randint(0, self.num_players - 1)
-        self.owners_flat = [grid.owners[y][x] for y in range(self.height) for x in range(self.width)]
-        self.armies_flat = [grid.armies[y][x] for y in range(self.height) for x in range(self.width)]
-        self.types_flat = [grid.types[y][x] for y in range(self.height) for x in range(self.width)]
+        self.priority_player = int(self.rng.integers(self.num_players))
+        self.owners_flat = grid.owners.ravel().tolist()
+        self.armies_flat = grid.armies.ravel().tolist()
+        self.types_flat = grid.types.ravel().tolist()
         self.most_recent_start_move_squares = []
         self.most_recent_end_move_squares = []
 
     def sync_flat_to_grid(self):
-        """Sync flat lists back to grid arrays for display."""
-        for y in range(self.height):
-            for x in range(self.width):
-                idx = y * self.width + x
-                self.grid.owners[y][x] = self.owners_flat[idx]
-                self.grid.armies[y][x] = self.armies_flat[idx]
-                self.grid.types[y][x] = self.types_flat[idx]
+        """Sync flat lists back to grid arrays."""
+        self.grid.owners.flat[:] = self.owners_flat
+        self.grid.armies.flat[:] = self.armies_flat
+        self.grid.types.flat[:] = self.types_flat
 
-    def generate_and_validate_moves(self, player, start_coords, adjacent_indices, owners, armies, types):
+    def generate_and_validate_moves(self, player, start_coords):
         valid_moves = []
 
         for start_y, start_x in start_coords:
             idx_base = start_y * self.width + start_x
-            if owners[idx_base] != player or armies[idx_base] < 2:
+            if self.owners_flat[idx_base] != player or self.armies_flat[idx_base] < 2:
                 continue
 
             for j in range(4):
-                end_y, end_x = adjacent_indices[idx_base][j]
+                end_y, end_x = self.adjacent_indices[idx_base][j]
                 if end_y == -1:
                     continue
                 end_idx = end_y * self.width + end_x
-                if types[end_idx] != TileType.MOUNTAIN.value:
-                    valid_moves.append([player, start_x, start_y, end_x, end_y, 0])
+                if self.types_flat[end_idx] != TileType.MOUNTAIN.value:
+                    valid_moves.append([player, start_y, start_x, end_y, end_x, 0])
 
         return valid_moves
 
-    def generate_valid_moves(self, player):
-        start_coords = []
-        for y in range(self.height):
-            for x in range(self.width):
-                idx = y * self.width + x
-                if self.owners_flat[idx] == player and self.armies_flat[idx] >= 2:
-                    start_coords.append([y, x])
+    def _start_coords(self, player):
+        return [(idx // self.width, idx % self.width) for idx in range(self.height * self.width)
+                if self.owners_flat[idx] == player and self.armies_flat[idx] >= 2]
 
-        move_list = self.generate_and_validate_moves(
-            player, start_coords, self.adjacent_indices,
-            self.owners_flat, self.armies_flat, self.types_flat
-        )
+    def generate_valid_moves_array(self, player) -> np.ndarray:
+        """
+        Generate every valid move of a player as a (num_moves, 6) int16 array, in the same order as
+        LocalGame.generate_valid_moves_array.
+        """
+        moves = self.generate_and_validate_moves(player, self._start_coords(player))
+        return np.array(moves, dtype=np.int16).reshape(-1, 6)
 
-        valid_moves = [
-            Move(player, False, move[1], move[2], move[3], move[4])
-            for move in move_list
-        ]
-        return valid_moves
+    def generate_valid_moves(self, player):
+        return [Move(player, False, move[1], move[2], move[3], move[4])
+                for move in self.generate_and_validate_moves(player, self._start_coords(player))]
 
-    def make_move(self, start_x, start_y, end_x, end_y, player, split):
-        move = [player, start_x, start_y, end_x, end_y, split]
-        valid_moves = self.generate_and_validate_moves(
-            player, [[start_y, start_x]], self.adjacent_indices,
-            self.owners_flat, self.armies_flat, self.types_flat
-        )
-        if move not in valid_moves:
-            print(f"Move {move} not in valid moves: {valid_moves}")
+    def make_move(self, start_y, start_x, end_y, end_x, player, split):
+        move = [player, start_y, start_x, end_y, end_x, split]
+        if not self.generate_and_validate_moves(player, [(start_y, start_x)]):
             return False
 
         captured_general = execute_move(
             move, self.owners_flat, self.armies_flat, self.types_flat, self.height, self.width
         )
-
         if captured_general != -1:
-            for i in range(self.height * self.width):
-                if self.owners_flat[i] == captured_general:
-                    self.owners_flat[i] = player
-                    self.armies_flat[i] = (self.armies_flat[i] + 1) // 2
+            transfer_territory(self.owners_flat, self.armies_flat, captured_general, player)
 
         self.sync_flat_to_grid()
         return True
 
     def update_armies(self):
-        size = self.height * self.width
-        for i in range(size):
+        for i in range(self.height * self.width):
             owner = self.owners_flat[i]
             if owner != -1:
                 tile_type = self.types_flat[i]
@@ -172,59 +162,40 @@ class LocalGame:
                     self.armies_flat[i] = max(0, self.armies_flat[i] - 1)
                     if self.armies_flat[i] == 0:
                         self.owners_flat[i] = -1
-        self.sync_flat_to_grid()
-
-    def process_turn_internal(self, moves, move_counts, num_players, owners, armies, types):
-        for player in range(num_players):
-            for i in range(move_counts[player]):
-                if i < len(moves[player]):
-                    captured_general = execute_move(
-                        moves[player][i], owners, armies, types, self.height, self.width
-                    )
-                    if captured_general != -1:
-                        for j in range(self.height * self.width):
-                            if owners[j] == captured_general:
-                                owners[j] = moves[player][i][0]
-                                armies[j] = (armies[j] + 1) // 2
 
     def process_turn(self, moves=None):
+        """
+        Execute one turn, see LocalGame.process_turn. Moves are executed in order and are not validated.
+        """
         if moves is None:
             moves = []
+        if isinstance(moves, ActionBatch):
+            moves = moves.to_moves()
+        if isinstance(moves, np.ndarray):
+            moves = moves.tolist()
+        else:
+            moves = [[move.player_index, move.start[0], move.start[1], move.end[0], move.end[1], int(move.split)]
+                     for move in moves if not move.is_pass]
 
-        self.move_counts = [0] * self.num_players
-        self.most_recent_start_move_squares = []
-        self.most_recent_end_move_squares = []
+        self.most_recent_start_move_squares = [(move[1], move[2]) for move in moves]
+        self.most_recent_end_move_squares = [(move[3], move[4]) for move in moves]
 
-        player_moves = [[] for _ in range(self.num_players)]
         for move in moves:
-            player = move.player_index
-            move_tuple = [player, move.start[0], move.start[1], move.end[0], move.end[1], move.split]
-            # Validate move before adding
-            valid_moves = self.generate_and_validate_moves(
-                player, [[move.start[1], move.start[0]]], self.adjacent_indices,
-                self.owners_flat, self.armies_flat, self.types_flat
+            captured_general = execute_move(
+                move, self.owners_flat, self.armies_flat, self.types_flat, self.height, self.width
             )
-            if move_tuple in valid_moves:
-                player_moves[player].append(move_tuple)
-                self.move_counts[player] += 1
-                self.most_recent_start_move_squares.append((move.start[1], move.start[0]))
-                self.most_recent_end_move_squares.append((move.end[1], move.end[0]))
-            else:
-                print(f"Skipping invalid move for player {player}: {move_tuple}")
-
-        self.process_turn_internal(
-            player_moves, self.move_counts, self.num_players,
-            self.owners_flat, self.armies_flat, self.types_flat
-        )
+            if captured_general != -1:
+                transfer_territory(self.owners_flat, self.armies_flat, captured_general, move[0])
 
         self.priority_player = (self.priority_player + 1) % self.num_players
         self._turn += 1
         self.update_armies()
+        self.sync_flat_to_grid()
 
-    def _format_tile(self, x, y):
-        owner = self.grid.owners[y][x]
-        armies = self.grid.armies[y][x]
-        tile_type = TileType(self.grid.types[y][x])
+    def _format_tile(self, y, x):
+        owner = self.grid.owners[y, x]
+        armies = self.grid.armies[y, x]
+        tile_type = TileType(self.grid.types[y, x])
         if tile_type == TileType.MOUNTAIN:
             return owner, "MNT", armies
         elif tile_type == TileType.GENERAL:
@@ -276,7 +247,7 @@ class LocalGame:
     def display_board(self):
         board_grid = []
         for y in range(self.height):
-            row = [self._format_tile(x, y) for x in range(self.width)]
+            row = [self._format_tile(y, x) for x in range(self.width)]
             board_grid.append(row)
 
         to_print_board = []
@@ -307,7 +278,7 @@ class LocalGame:
 
     def benchmark(self, num_turns=100, seed=42, display_every=None):
         print(f"\nRunning benchmark for {num_turns} turns with seed {seed}...")
-        random.seed(seed)
+        rng = np.random.default_rng(seed)
 
         start_time = time.time()
         total_moves = 0
@@ -326,7 +297,7 @@ class LocalGame:
             for player in range(self.num_players):
                 player_moves = self.generate_valid_moves(player)
                 if player_moves:
-                    random_move = random.randint(0, len(player_moves) - 1)
+                    random_move = rng.integers(len(player_moves))
                     moves.append(player_moves[random_move])
             self.process_turn(moves)
         turn_process_time = time.time() - start_time
@@ -337,7 +308,7 @@ class LocalGame:
 
 
 if __name__ == "__main__":
-    game = LocalGame(Grid(width=18, height=20, players=16, uniform_city_density=0.02, uniform_mountain_density=0.15))
+    game = PythonLocalGame(Grid(width=18, height=20, players=16, uniform_city_density=0.02, uniform_mountain_density=0.15))
     game.display_board()
     move_time, turn_time = game.benchmark(100000, 1000, 1000)
     print("\nAfter benchmark:")
@@ -1,16 +1,27 @@
 import dataclasses
 import re
 import sys
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional
 
 import numpy as np
 from numpy.typing import NDArray
-from scipy.ndimage import maximum_filter
 
 from __init__ import PLAYER_COLORS_HEX, TileType
+from genghis.game.bitboard import dilate, from_bitboard, to_bitboard
 from genghis.replays.deserialize import Replay, convert_coordinates, deserialize
 
 
+# What a tile type looks like from the fog, indexed by TileType. Structures a player can't see look like mountains
+# and generals and deserts look like plains.
+FOG_TERRAIN = np.arange(max(TileType) + 1, dtype=np.uint8)
+FOG_TERRAIN[[TileType.CITY, TileType.OBSERVATORY, TileType.LOOKOUT]] = TileType.MOUNTAIN
+FOG_TERRAIN[[TileType.GENERAL, TileType.DESERT]] = TileType.PLAIN
+FOG_TERRAIN.flags.writeable = False
+
+# Owner of the tiles a player can't see
+FOG_OWNER = -2
+
+
 def random_city_positions(number_cities: int, grid: 'Grid') -> NDArray[np.int64]:
     """
     Generate random positions for cities on the grid.
@@ -23,12 +34,16 @@ def random_city_positions(number_cities: int, grid: 'Grid') -> NDArray[np.int64]
         Array of shape (number_cities, 2) containing [y, x] coordinates
     """
     available_positions = np.argwhere(grid.types == TileType.PLAIN)
-    selected_indices = np.random.choice(len(available_positions), size=number_cities, replace=False)
+    selected_indices = grid.rng.choice(len(available_positions), size=number_cities, replace=False)
     return available_positions[selected_indices]
 
 
-# Configure numpy printing options
-np.set_printoptions(threshold=np.inf, linewidth=np.inf)
+def set_debug_print_options() -> None:
+    """
+    Make numpy print whole grid arrays on a single line per row instead of summarizing them. This changes numpy's
+    global print options, so it is left to scripts to call.
+    """
+    np.set_printoptions(threshold=np.inf, linewidth=np.inf)
 
 
 @dataclasses.dataclass
@@ -91,6 +106,40 @@ class GridParameters:
     uniform_fairness: Optional[float] = None
 
 
+def pack_tiles(owners: NDArray[np.int8], types: NDArray[np.uint8]) -> Tuple[NDArray[np.int8], NDArray[np.uint8]]:
+    """
+    Copy owners and types into the two halves of a single contiguous int8 block, so the per-tile bytes of a grid
+    live in one allocation.
+
+    Args:
+        owners: Owner of every tile, -1 if neutral
+        types: TileType of every tile
+
+    Returns:
+        (owners, types) views into the new block, with the same shapes and dtypes as the inputs
+    """
+    tiles = np.empty((2,) + owners.shape, dtype=np.int8)
+    tiles[0] = owners
+    tiles[1] = types
+    return tiles[0], tiles[1].view(np.uint8)
+
+
+def spawn_generators(rng: np.random.Generator | np.random.SeedSequence | int | None,
+                     count: int) -> List[np.random.Generator]:
+    """
+    Create independent random generators, e.g. one per worker of a pool or one per game of a batch.
+
+    Args:
+        rng: Parent generator, seed sequence or seed. The children only depend on it and on their index, so the
+            same parent always produces the same streams.
+        count: Number of generators to create
+
+    Returns:
+        The child generators
+    """
+    return np.random.default_rng(rng).spawn(count)
+
+
 class Grid:
     """Represents a game grid with terrain, armies, and ownership."""
 
@@ -110,7 +159,8 @@ class Grid:
                  players: Optional[int] = None,
                  minimum_city_value: int = 40,
                  maximum_city_value: int = 50,
-                 minimum_manhattan: Optional[int] = None):
+                 minimum_manhattan: Optional[int] = None,
+                 rng: Optional[np.random.Generator | np.random.SeedSequence | int] = None):
         """
         Initialize a new game grid.
 
@@ -126,14 +176,16 @@ class Grid:
             uniform_city_density: Density for uniform city generation
             uniform_mountain_density: Density for uniform mountain generation
             general_positions: List of specific general positions
-            seed: Random seed for reproducibility
+            seed: Random seed for reproducibility, used if rng is not given
             players: Number of players
             minimum_city_value: Minimum army value for cities
             maximum_city_value: Maximum army value for cities
             minimum_manhattan: Minimum Manhattan distance between generals
+            rng: Random generator, seed sequence or seed of this grid. It is kept as Grid.rng and never touches
+                the global numpy random state, so grids can be generated concurrently. Use spawn_generators to
+                give every worker its own independent stream.
         """
-        if seed is not None:
-            np.random.seed(seed)
+        self.rng = np.random.default_rng(rng if rng is not None else seed)
 
         # Validate width/height parameters
         assert (min_width is None and max_width is None) or \
@@ -144,8 +196,8 @@ class Grid:
             "Either both or neither of min_height and max_height must be defined."
 
         # Set grid dimensions
-        self.width = width if min_width is None else np.random.randint(min_width, max_width)
-        self.height = height if min_height is None else np.random.randint(min_height, max_height)
+        self.width = width if min_width is None else int(self.rng.integers(min_width, max_width))
+        self.height = height if min_height is None else int(self.rng.integers(min_height, max_height))
 
         # Validate and set player count
         if players is not None and general_positions is not None:
@@ -156,17 +208,17 @@ class Grid:
         self.minimum_general_distance_manhattan = minimum_manhattan if minimum_manhattan is not None else 0
 
         # Initialize grid arrays
-        self.types: NDArray[np.uint8] = np.full(self.dimensions, TileType.PLAIN, dtype=np.uint8)
-        self.armies: NDArray[np.int64] = np.full(self.dimensions, 0, dtype=np.int64)
-        self.owners: NDArray[np.int8] = np.full(self.dimensions, -1, dtype=np.int8)
+        self.owners, self.types = pack_tiles(np.full(self.dimensions, -1, dtype=np.int8),
+                                             np.full(self.dimensions, TileType.PLAIN, dtype=np.uint8))
+        self.armies: NDArray[np.int32] = np.full(self.dimensions, 0, dtype=np.int32)
         self.lights: NDArray[np.bool] = np.full(self.dimensions, False, dtype=np.bool)
 
         # Local helper functions for quantity calculations
         def _calculate_num_cities_gio() -> int:
-            return round(5 + (self.num_players * (2 + np.random.rand())))
+            return round(5 + (self.num_players * (2 + self.rng.random())))
 
         def _calculate_num_mountains_gio() -> int:
-            return round(self.width * self.height * 0.2 + 0.08 * np.random.rand())
+            return round(self.width * self.height * 0.2 + 0.08 * self.rng.random())
 
         def _calculate_num_cities_uniform() -> int:
             return round(uniform_city_density * self.width * self.height)
@@ -195,7 +247,7 @@ class Grid:
             num_swamps: Number of swamp tiles to place
         """
         available_positions = np.argwhere(self.types == TileType.PLAIN)
-        selected_indices = np.random.choice(len(available_positions), size=num_swamps, replace=False)
+        selected_indices = self.rng.choice(len(available_positions), size=num_swamps, replace=False)
         selected_positions = available_positions[selected_indices]
         self.types[selected_positions[:, 0], selected_positions[:, 1]] = TileType.SWAMP
 
@@ -207,7 +259,7 @@ class Grid:
             num_mountains: Number of mountain tiles to place
         """
         available_positions = np.argwhere(self.types == TileType.PLAIN)
-        selected_indices = np.random.choice(len(available_positions), size=num_mountains, replace=False)
+        selected_indices = self.rng.choice(len(available_positions), size=num_mountains, replace=False)
         selected_positions = available_positions[selected_indices]
         self.types[selected_positions[:, 0], selected_positions[:, 1]] = TileType.MOUNTAIN
 
@@ -219,10 +271,10 @@ class Grid:
             num_cities: Number of city tiles to place
         """
         available_positions = np.argwhere(self.types == TileType.PLAIN)
-        selected_indices = np.random.choice(len(available_positions), size=num_cities, replace=False)
+        selected_indices = self.rng.choice(len(available_positions), size=num_cities, replace=False)
         selected_positions = available_positions[selected_indices]
         self.types[selected_positions[:, 0], selected_positions[:, 1]] = TileType.CITY
-        self.armies[selected_positions[:, 0], selected_positions[:, 1]] = np.random.randint(
+        self.armies[selected_positions[:, 0], selected_positions[:, 1]] = self.rng.integers(
             low=self.city_boundaries[0],
             high=self.city_boundaries[1],
             size=num_cities
@@ -236,7 +288,7 @@ class Grid:
             num_generals: Number of general tiles to place
         """
         available_positions = np.argwhere(self.types == TileType.PLAIN)
-        selected_indices = np.random.choice(len(available_positions), size=num_generals, replace=False)
+        selected_indices = self.rng.choice(len(available_positions), size=num_generals, replace=False)
         selected_positions = available_positions[selected_indices]
         self.types[selected_positions[:, 0], selected_positions[:, 1]] = TileType.GENERAL
         self.armies[selected_positions[:, 0], selected_positions[:, 1]] = 1
@@ -252,40 +304,54 @@ class Grid:
         Returns:
             Boolean array indicating visible tiles
         """
-        return np.bool(maximum_filter(self.owners == player_index, size=3) | self.lights)
+        visible = dilate(to_bitboard(self.owners == player_index), self.width)
+        return from_bitboard(visible, self.width) | self.lights
+
+    def vision_masks(self) -> NDArray[np.bool]:
+        """
+        Compute the visibility masks of every player at once.
+
+        Returns:
+            Boolean array of shape (num_players, height, width)
+        """
+        players = np.arange(self.num_players, dtype=np.int8)[:, np.newaxis, np.newaxis]
+        visible = dilate(to_bitboard(self.owners == players), self.width)
+        return from_bitboard(visible, self.width) | self.lights
 
-    def perspective(self, player_index: int) -> None:
+    def perspective(self, visible: Optional[NDArray[np.bool]] = None,
+                    out: Optional[Tuple[NDArray[np.int8], NDArray[np.int32], NDArray[np.uint8]]] = None
+                    ) -> Tuple[NDArray[np.int8], NDArray[np.int32], NDArray[np.uint8]]:
         """
-        Calculate player's perspective of the grid (incomplete implementation).
+        Compute what every player sees of the grid. Tiles in the fog have owner FOG_OWNER and no armies, and their
+        type is replaced following FOG_TERRAIN, e.g. cities look like mountains.
 
         Args:
-            player_index: Index of the player to compute perspective for
+            visible: (num_players, height, width) visibility masks, e.g. from LocalGame's vision bits. Computed
+                with vision_masks if None.
+            out: (owners, armies, types) arrays of shape (num_players, height, width) to write into, with the
+                dtypes of the grid's arrays. Allocated if None, so pass them in to serve observations every turn
+                without allocating.
+
+        Returns:
+            The (owners, armies, types) perspective of every player
         """
-        vision_mask = self._compute_vision_mask_traditional(player_index)
-        owners = np.where(vision_mask, self.owners, -2)
-        armies = np.where(vision_mask, self.armies, 0)
-
-        terrain_rules: Dict[TileType, TileType] = {
-            TileType.GENERAL: TileType.PLAIN,
-            TileType.DESERT: TileType.PLAIN,
-            TileType.CITY: TileType.MOUNTAIN,
-            TileType.OBSERVATORY: TileType.MOUNTAIN,
-            TileType.LOOKOUT: TileType.MOUNTAIN
-        }
-
-        original_types = np.array(list(terrain_rules.keys()))
-        invisible_types = np.array(list(terrain_rules.values()))
-        is_defined_type = np.isin(self.types, original_types)
-        type_indices = np.searchsorted(original_types, self.types)
-        type_indices = np.clip(type_indices, 0, len(original_types) - 1)
-        converted_values = invisible_types[type_indices]
-        mapped_values = np.where(is_defined_type, converted_values, self.types)
-
-        types = np.where(
-            vision_mask,
-            self.types,  # Keep original if visible
-            mapped_values  # Use converted value if invisible
-        )
+        if visible is None:
+            visible = self.vision_masks()
+        if out is None:
+            shape = (self.num_players,) + self.dimensions
+            out = (np.empty(shape, dtype=self.owners.dtype), np.empty(shape, dtype=self.armies.dtype),
+                   np.empty(shape, dtype=self.types.dtype))
+        owners, armies, types = out
+
+        owners.fill(FOG_OWNER)
+        np.copyto(owners, self.owners, where=visible)
+        armies.fill(0)
+        np.copyto(armies, self.armies, where=visible)
+        # The fogged terrain is looked up for the first player and copied to the others, which avoids a temporary
+        np.take(FOG_TERRAIN, self.types, out=types[0], mode="clip")
+        types[1:] = types[0]
+        np.copyto(types, self.types, where=visible)
+        return owners, armies, types
 
     def __str__(self) -> str:
         """Return a formatted string representation of the grid."""
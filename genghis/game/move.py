@@ -0,0 +1,30 @@
+class Move:
+    """
+    A single move of a player's army from one tile to an adjacent one, as produced by
+    LocalGame.generate_valid_moves and consumed by LocalGame.process_turn.
+    """
+    __slots__ = ("player_index", "is_pass", "start", "end", "split")
+
+    def __init__(self, player_index: int, is_pass: bool, start_y: int = 0, start_x: int = 0, end_y: int = 0,
+                 end_x: int = 0, split: bool = False):
+        """
+        Args:
+            player_index: Index of the player making the move
+            is_pass: Whether the player skips this turn. The remaining arguments are ignored if so.
+            start_y: Row the armies move from
+            start_x: Column the armies move from
+            end_y: Row the armies move to
+            end_x: Column the armies move to
+            split: Whether only half of the armies are moved
+        """
+        self.player_index = player_index
+        self.is_pass = is_pass
+        self.start = (start_y, start_x)
+        self.end = (end_y, end_x)
+        self.split = split
+
+    def __repr__(self) -> str:
+        if self.is_pass:
+            return f"Move(player {self.player_index} passes)"
+        kind = "split-move" if self.split else "move"
+        return f"Move(player {self.player_index} {kind} from {self.start} to {self.end})"
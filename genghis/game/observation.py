@@ -1,9 +1,19 @@
 import dataclasses
+from collections.abc import ItemsView, KeysView, ValuesView
 
 import numpy as np
 
+from genghis.game import TileType
 
-@dataclasses.dataclass
+# Channels of Observation.as_tensor: the boards first, then one constant plane per scalar
+PLANE_CHANNELS = ("armies", "generals", "cities", "mountains", "neutral_cells", "owned_cells", "opponent_cells",
+                  "fog_cells", "structures_in_fog")
+SCALAR_CHANNELS = ("owned_land_count", "owned_army_count", "opponent_land_count", "opponent_army_count", "timestep",
+                   "priority")
+TENSOR_CHANNELS = PLANE_CHANNELS + SCALAR_CHANNELS
+
+
+@dataclasses.dataclass(slots=True)
 class Observation(dict):
     """
     We override some dictionary methods and subclass dict to allow the
@@ -13,6 +23,11 @@ class Observation(dict):
     These steps are necessary because PettingZoo & Gymnasium expect
     dictionary-like Observation objects, but we want the benefits of
     knowing the dictionaries' members which a dataclass/class provides.
+
+    The dictionary interface is a view over the fields: nothing is stored in the
+    underlying dict and the arrays are never copied, so the fields can be views
+    into larger buffers (e.g. one board of a (B, H, W) array per observation)
+    and keep pointing at them.
     """
 
     armies: np.ndarray
@@ -32,16 +47,30 @@ class Observation(dict):
     priority: int = 0
 
     def __getitem__(self, attribute_name: str):
+        if attribute_name not in _FIELD_NAMES:
+            raise KeyError(attribute_name)
         return getattr(self, attribute_name)
 
+    def __iter__(self):
+        return iter(_FIELD_NAMES)
+
+    def __len__(self):
+        return len(_FIELD_NAMES)
+
+    def __contains__(self, attribute_name) -> bool:
+        return attribute_name in _FIELD_NAMES
+
+    def get(self, attribute_name: str, default=None):
+        return getattr(self, attribute_name) if attribute_name in _FIELD_NAMES else default
+
     def keys(self):
-        return dataclasses.asdict(self).keys()
+        return KeysView(self)
 
     def values(self):
-        return dataclasses.asdict(self).values()
+        return ValuesView(self)
 
     def items(self):
-        return dataclasses.asdict(self).items()
+        return ItemsView(self)
 
     def pad_observation(self, pad_to: int) -> None:
         """
@@ -73,33 +102,138 @@ class Observation(dict):
         # Special case for mountains which are padded with ones
         self.mountains = np.pad(self.mountains, (h_pad, w_pad), "constant", constant_values=1)
 
-    def as_tensor(self, pad_to: int | None = None) -> np.ndarray:
+    def as_tensor(self, pad_to: int | None = None, out: np.ndarray | None = None, dtype=np.float64) -> np.ndarray:
         """
-        Returns a 3D tensor of shape (15, rows, cols). Suitable for neural nets.
+        Returns a 3D tensor of shape (15, rows, cols), with the channels in the order of TENSOR_CHANNELS. Suitable for
+        neural nets. Unlike pad_observation, padding leaves the observation unchanged.
+
+        Args:
+            pad_to: Size of the square tensor, must be >= the current observation size. By default, the observation
+                size is used.
+            out: Buffer of shape (15, rows, cols) to write the tensor into instead of allocating a new one. Nothing is
+                allocated when it is given, so it can be reused every turn.
+            dtype: dtype of the new tensor, e.g. np.float32 or np.uint8. Ignored when out is given. With an integer
+                dtype, values (armies, counts, timestep) saturate at its maximum instead of wrapping around.
+
+        Returns:
+            The tensor, i.e. out if it was given
         """
+        height, width = self.armies.shape
         if pad_to is not None:
-            self.pad_observation(pad_to)
-            shape = (pad_to, pad_to)
+            assert pad_to >= max(height, width), "Can't pad to a smaller size than the original observation."
+            shape = (len(TENSOR_CHANNELS), pad_to, pad_to)
+        else:
+            shape = (len(TENSOR_CHANNELS), height, width)
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        assert out.shape == shape, f"out has shape {out.shape}, expected {shape}."
+
+        maximum = np.iinfo(out.dtype).max if np.issubdtype(out.dtype, np.integer) else None
+        for channel, name in enumerate(PLANE_CHANNELS):
+            plane = out[channel, :height, :width]
+            if maximum is None:
+                np.copyto(plane, getattr(self, name), casting="unsafe")
+            else:
+                np.clip(getattr(self, name), 0, maximum, out=plane, casting="unsafe")
+            # Mountains are padded with ones, the rest with zeros
+            out[channel, height:, :] = name == "mountains"
+            out[channel, :height, width:] = name == "mountains"
+        for channel, name in enumerate(SCALAR_CHANNELS, start=len(PLANE_CHANNELS)):
+            value = getattr(self, name)
+            out[channel].fill(value if maximum is None else min(max(value, 0), maximum))
+        return out
+
+
+_FIELD_NAMES = tuple(field.name for field in dataclasses.fields(Observation))
+
+
+def _tensor_buffer(shape: tuple, out: np.ndarray | None, dtype) -> np.ndarray:
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    assert out.shape == shape, f"out has shape {out.shape}, expected {shape}."
+    return out
+
+
+def encode_batch(observations, pad_to: int | None = None, out: np.ndarray | None = None,
+                 dtype=np.float64) -> np.ndarray:
+    """
+    Encode observations into one (B, 15, pad_to, pad_to) tensor, each one like Observation.as_tensor. Every
+    observation is written straight into its slice of the batch, so there are no per-observation tensors to stack.
+
+    Args:
+        observations: Sequence of B Observations
+        pad_to: Size of the tensor, must be >= the size of every observation. Can only be omitted if all
+            observations have the same size.
+        out: Buffer of shape (B, 15, pad_to, pad_to) to write into, allocated with dtype if None
+        dtype: dtype of the new tensor, ignored when out is given
+
+    Returns:
+        The tensor, i.e. out if it was given
+    """
+    height, width = observations[0].armies.shape if pad_to is None else (pad_to, pad_to)
+    out = _tensor_buffer((len(observations), len(TENSOR_CHANNELS), height, width), out, dtype)
+    for observation, tensor in zip(observations, out):
+        observation.as_tensor(pad_to, out=tensor)
+    return out
+
+
+def encode_perspectives(owners: np.ndarray, armies: np.ndarray, types: np.ndarray, land_counts, army_counts,
+                        timestep: int, priority_player: int, pad_to: int | None = None, out: np.ndarray | None = None,
+                        dtype=np.float64) -> np.ndarray:
+    """
+    Encode the observation of every player of a game directly from the engine's perspective arrays, without
+    building Observation objects. The channels are those of Observation.as_tensor, with every other player counted
+    as an opponent.
+
+    Args:
+        owners: (num_players, height, width) owners seen by each player, FOG_OWNER (-2) in the fog, as returned by
+            LocalGame.perspective or Grid.perspective
+        armies: (num_players, height, width) armies seen by each player
+        types: (num_players, height, width) tile types seen by each player
+        land_counts: Number of tiles of each player
+        army_counts: Total army of each player
+        timestep: Current turn
+        priority_player: Player whose moves are processed first this turn
+        pad_to: Size of the square tensor, must be >= the board size. By default, the board size is used.
+        out: Buffer of shape (num_players, 15, rows, cols) to write into, allocated with dtype if None
+        dtype: dtype of the new tensor, ignored when out is given
+
+    Returns:
+        The tensor, i.e. out if it was given
+    """
+    num_players, height, width = owners.shape
+    if pad_to is not None:
+        assert pad_to >= max(height, width), "Can't pad to a smaller size than the board."
+    size = (height, width) if pad_to is None else (pad_to, pad_to)
+    out = _tensor_buffer((num_players, len(TENSOR_CHANNELS)) + size, out, dtype)
+
+    players = np.arange(num_players)[:, np.newaxis, np.newaxis]
+    fog = owners < -1
+    mountains = types == TileType.MOUNTAIN
+    planes = {
+        "armies": armies,
+        "generals": types == TileType.GENERAL,
+        "cities": types == TileType.CITY,
+        "mountains": mountains & ~fog,
+        "neutral_cells": (owners == -1) & ~mountains,
+        "owned_cells": owners == players,
+        "opponent_cells": (owners >= 0) & (owners != players),
+        "fog_cells": fog & ~mountains,
+        "structures_in_fog": fog & mountains,
+    }
+    maximum = np.iinfo(out.dtype).max if np.issubdtype(out.dtype, np.integer) else None
+    for channel, name in enumerate(PLANE_CHANNELS):
+        if maximum is None:
+            np.copyto(out[:, channel, :height, :width], planes[name], casting="unsafe")
         else:
-            shape = self.armies.shape
-
-        return np.stack(
-            [
-                self.armies,
-                self.generals,
-                self.cities,
-                self.mountains,
-                self.neutral_cells,
-                self.owned_cells,
-                self.opponent_cells,
-                self.fog_cells,
-                self.structures_in_fog,
-                np.ones(shape) * self.owned_land_count,
-                np.ones(shape) * self.owned_army_count,
-                np.ones(shape) * self.opponent_land_count,
-                np.ones(shape) * self.opponent_army_count,
-                np.ones(shape) * self.timestep,
-                np.ones(shape) * self.priority,
-            ],
-            axis=0,
-        )
\ No newline at end of file
+            np.clip(planes[name], 0, maximum, out=out[:, channel, :height, :width], casting="unsafe")
+        out[:, channel, height:, :] = name == "mountains"
+        out[:, channel, :height, width:] = name == "mountains"
+
+    land_counts, army_counts = np.asarray(land_counts), np.asarray(army_counts)
+    scalars = np.stack([land_counts, army_counts, land_counts.sum() - land_counts, army_counts.sum() - army_counts,
+                        np.full(num_players, timestep), np.arange(num_players) == priority_player], axis=1)
+    if maximum is not None:
+        scalars = np.clip(scalars, 0, maximum)
+    out[:, len(PLANE_CHANNELS):] = scalars[:, :, np.newaxis, np.newaxis]
+    return out
@@ -1,26 +1,50 @@
 import time
+from collections import namedtuple
 
 import numpy as np
-from line_profiler import profile
 from numpy._typing import NDArray
 
 from __init__ import TileType
 from genghis.game.game import LocalGame
-from genghis.game.grid import Grid
+from genghis.game.grid import Grid, pack_tiles
 from genghis.replays.deserialize import Replay, convert_coordinates
 
 
+def build_move_table(moves) -> tuple[NDArray[np.int64], NDArray[np.int16]]:
+    """
+    Index the moves of a replay by turn, in CSR layout.
+
+    Args:
+        moves: Moves of the replay, with the turn they were made on in move.turn
+
+    Returns:
+        turn_offsets and move_rows, where the moves of turn t are move_rows[turn_offsets[t]:turn_offsets[t + 1]] in
+        their original order, as [player, start_y, start_x, end_y, end_x, split] rows for LocalGame.process_turn.
+        turn_offsets has one entry per turn up to the last turn with a move, plus one.
+    """
+    turns = np.array([move.turn for move in moves], dtype=np.int64)
+    rows = np.array([[move.player_index, move.start[0], move.start[1], move.end[0], move.end[1], move.split]
+                     for move in moves], dtype=np.int16).reshape(-1, 6)
+    order = np.argsort(turns, kind="stable")
+    counts = np.bincount(turns, minlength=1)
+    turn_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=turn_offsets[1:])
+    return turn_offsets, rows[order]
+
+
 class ReplayGrid(Grid):
     """Grid initialized from a replay object."""
 
-    def __init__(self, replay: Replay):
+    def __init__(self, replay: Replay, rng: np.random.Generator | None = None):
         """
         Initialize grid from a replay.
 
         Args:
             replay: Replay object containing game state
+            rng: Random generator, seed sequence or seed of the grid, see Grid.__init__
         """
         self.replay = replay
+        self.rng = np.random.default_rng(rng)
 
         square_conversion = {
             TileType.CITY: replay.city_mask,
@@ -31,9 +55,9 @@ class ReplayGrid(Grid):
         dimensions = (replay.height, replay.width)
 
         # Initialize grid arrays
-        self.types: NDArray[np.uint8] = np.full(dimensions, TileType.PLAIN, dtype=np.uint8)
-        self.armies: NDArray[np.uint16] = np.full(dimensions, 0, dtype=np.uint16)
-        self.owners: NDArray[np.int8] = np.full(dimensions, -1, dtype=np.int8)
+        self.owners, self.types = pack_tiles(np.full(dimensions, -1, dtype=np.int8),
+                                             np.full(dimensions, TileType.PLAIN, dtype=np.uint8))
+        self.armies: NDArray[np.int32] = np.full(dimensions, 0, dtype=np.int32)
         self.lights: NDArray[np.bool] = np.full(dimensions, False, dtype=np.bool)
 
         # Set terrain types
@@ -55,13 +79,135 @@ class ReplayGrid(Grid):
         self.width = self.types.shape[1]
         self.height = self.types.shape[0]
 
+        # Moves grouped by turn, so replaying a turn is a slice
+        self.turn_offsets, self.move_rows = build_move_table(replay.moves)
+
+
+# Copies of the flat owners, armies and types of a game. Seeking rebuilds the tracker with LocalGame.set_board, so
+# unlike a GameSnapshot no tracker state is kept.
+Board = namedtuple("Board", ["owners", "armies", "types"])
+
+
+def _copy_board(game: LocalGame) -> Board:
+    return Board(game.owners_flat.copy(), game.armies_flat.copy(), game.types_flat.copy())
+
+
+class ReplayStateStore:
+    """
+    States of every simulated turn of a game. A full Board (keyframe) is kept every keyframe_interval turns,
+    and every turn in between is stored as the tiles it changed, with their values before and after it. Memory is
+    proportional to the number of changed tiles, and reaching any stored turn applies at most keyframe_interval
+    deltas, forwards from the keyframe before it or backwards from the one after it.
+    """
+
+    # Columns of the delta rows
+    TILE, OWNER_BEFORE, ARMY_BEFORE, TYPE_BEFORE, OWNER_AFTER, ARMY_AFTER, TYPE_AFTER = range(7)
+
+    def __init__(self, game: LocalGame, keyframe_interval: int = 32):
+        """
+        Args:
+            game: Game whose current state is the first stored turn
+            keyframe_interval: Number of turns between keyframes
+        """
+        assert keyframe_interval > 0, "keyframe_interval must be positive."
+        self.keyframe_interval = keyframe_interval
+        self.first_turn = game._turn
+        self.keyframes = [_copy_board(game)]
+        self.priority_players = [game.priority_player]
+        self.delta_offsets = [0]  # Deltas of turn t -> t + 1 are delta_rows[delta_offsets[t]:delta_offsets[t + 1]]
+        self.delta_rows = np.empty((0, 7), dtype=np.int32)
+        self._latest = _copy_board(game)  # Board of the last stored turn
+        self._state = _copy_board(game)  # Board of the last turn seeked to
+        self._state_index = 0
+
+    @property
+    def last_turn(self) -> int:
+        """The last stored turn."""
+        return self.first_turn + len(self.delta_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the keyframes, the delta rows (including their spare capacity) and the two work boards."""
+        boards = self.keyframes + [self._latest, self._state]
+        return sum(array.nbytes for board in boards for array in board) + self.delta_rows.nbytes
+
+    def record(self, game: LocalGame):
+        """
+        Store the state of game after it processed the turn following the last stored turn.
+        """
+        assert game._turn == self.last_turn + 1, f"Expected turn {self.last_turn + 1}, the game is at {game._turn}."
+        tiles = game.changed_tiles()
+        rows = np.empty((len(tiles), 7), dtype=np.int32)
+        rows[:, self.TILE] = tiles
+        for column, before, after in ((self.OWNER_BEFORE, self._latest.owners, game.owners_flat),
+                                      (self.ARMY_BEFORE, self._latest.armies, game.armies_flat),
+                                      (self.TYPE_BEFORE, self._latest.types, game.types_flat)):
+            rows[:, column] = before[tiles]
+            rows[:, column + 3] = before[tiles] = after[tiles]
+
+        start = self.delta_offsets[-1]
+        if start + len(rows) > len(self.delta_rows):  # Double the capacity, so appending stays amortized O(1)
+            grown = np.empty((max(start + len(rows), 2 * len(self.delta_rows)), 7), dtype=np.int32)
+            grown[:start] = self.delta_rows[:start]
+            self.delta_rows = grown
+        self.delta_rows[start:start + len(rows)] = rows
+        self.delta_offsets.append(start + len(rows))
+        self.priority_players.append(game.priority_player)
+        if (len(self.delta_offsets) - 1) % self.keyframe_interval == 0:
+            self.keyframes.append(_copy_board(game))
+
+    def _apply(self, index: int, forward: bool):
+        # Move the seek state from turn index to index + 1 (forward) or from index + 1 to index (backward)
+        rows = self.delta_rows[self.delta_offsets[index]:self.delta_offsets[index + 1]]
+        offset = 3 if forward else 0
+        self._state.owners[rows[:, self.TILE]] = rows[:, self.OWNER_BEFORE + offset]
+        self._state.armies[rows[:, self.TILE]] = rows[:, self.ARMY_BEFORE + offset]
+        self._state.types[rows[:, self.TILE]] = rows[:, self.TYPE_BEFORE + offset]
+
+    def seek(self, game: LocalGame, turn: int):
+        """
+        Restore game to a stored turn.
+
+        Args:
+            game: The game to restore, e.g. the one the turns were recorded from
+            turn: A turn between first_turn and last_turn
+        """
+        assert self.first_turn <= turn <= self.last_turn, \
+            f"Turn {turn} is not stored, only turns {self.first_turn} to {self.last_turn} are."
+        index = turn - self.first_turn
+        keyframe = index // self.keyframe_interval
+        # Start from whichever of the current seek state and the surrounding keyframes is the fewest deltas away
+        starts = [(abs(index - self._state_index), self._state_index, None),
+                  (index - keyframe * self.keyframe_interval, keyframe * self.keyframe_interval, keyframe)]
+        if keyframe + 1 < len(self.keyframes):
+            starts.append(((keyframe + 1) * self.keyframe_interval - index, (keyframe + 1) * self.keyframe_interval,
+                           keyframe + 1))
+        _, start, start_keyframe = min(starts, key=lambda option: option[0])
+
+        if start_keyframe is not None:
+            source = self.keyframes[start_keyframe]
+            np.copyto(self._state.owners, source.owners)
+            np.copyto(self._state.armies, source.armies)
+            np.copyto(self._state.types, source.types)
+        for step in range(start, index):
+            self._apply(step, forward=True)
+        for step in range(start - 1, index - 1, -1):
+            self._apply(step, forward=False)
+        self._state_index = index
+        game.set_board(self._state.owners, self._state.armies, self._state.types, turn,
+                       self.priority_players[index])
+
+
 class ReplayGame(LocalGame):
-    def __init__(self, grid: ReplayGrid):
+    def __init__(self, grid: ReplayGrid, keyframe_interval: int = 32):
+        """
+        Args:
+            grid: Grid of the replay
+            keyframe_interval: Number of turns between full copies of the state, see ReplayStateStore
+        """
         super().__init__(grid)
-        self.history = [(self.grid.types, self.grid.armies, self.grid.owners)]
         self._turn = 0
-
-
+        self.history = ReplayStateStore(self, keyframe_interval)
 
     @property
     def turn(self):
@@ -73,25 +219,16 @@ class ReplayGame(LocalGame):
         if not (type(new_turn) == int and new_turn >= 0):
             raise TypeError("Turn value must be an integer greater than 0")
 
-        # If the turn we are requesting is 10, we need at least 11 items in the list
-        if len(self.history) > new_turn:
-            self.types, self.armies, self.owners = self.history[new_turn]
-        else:  # We can't retrieve the cached gamestate, which means that we need to simulate forward
-            starting_turn = len(self.history) - 1  # The turn ID of the gamestate
-
-            self._turn = starting_turn  # Set turn for move simulator
-            moves = {}
-            for move in self.grid.replay.moves:
-                if move.turn not in moves:
-                    moves[move.turn] = [move]
-                else:
-                    moves[move.turn].append(move)
-
-            for turn in range(starting_turn, new_turn):
-                if turn in moves:  # There is a move for this turn, pass em in
-                    self.process_turn(moves[turn])
-                    self.history.append((self.grid.types, self.grid.armies, self.grid.owners))
-                else:
+        if new_turn <= self.history.last_turn:
+            self.history.seek(self, new_turn)
+        else:  # We can't retrieve the stored gamestate, which means that we need to simulate forward
+            if self._turn != self.history.last_turn:
+                self.history.seek(self, self.history.last_turn)
+
+            turn_offsets, move_rows = self.grid.turn_offsets, self.grid.move_rows
+            for turn in range(self.history.last_turn, new_turn):
+                if turn + 1 < len(turn_offsets):
+                    self.process_turn(move_rows[turn_offsets[turn]:turn_offsets[turn + 1]])
+                else:  # No moves are left in the replay
                     self.process_turn()
-                    self.history.append((self.grid.types, self.grid.armies, self.grid.owners))
-
+                self.history.record(self)
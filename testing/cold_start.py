@@ -0,0 +1,62 @@
+"""
+Measures the cold-start time of the engine: how long a fresh interpreter takes to import the game, build a
+LocalGame and process its first turn, then how long genghis.game.warmup takes to reach every other kernel. The first
+run on a machine compiles every kernel and fills the on-disk cache, later runs should only pay for loading it.
+
+Usage: python testing/cold_start.py [--runs N] [--max-seconds S]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import time
+start = time.perf_counter()
+from genghis.game.game import LocalGame
+from genghis.game.grid import Grid
+imported = time.perf_counter()
+game = LocalGame(Grid(width=18, height=20, players=2, uniform_city_density=0.02, uniform_mountain_density=0.15))
+game.process_turn(game.legal_moves_array(0)[:1].copy())
+first_turn = time.perf_counter()
+from genghis.game import warmup
+warmup()
+print(imported - start, first_turn - imported, time.perf_counter() - first_turn)
+"""
+
+
+def measure() -> tuple[float, float, float]:
+    """
+    Run the engine in a fresh interpreter.
+
+    Returns:
+        Seconds spent importing, seconds from the end of the import to the end of the first turn, seconds spent
+        in warmup afterwards
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, os.path.join(ROOT, "genghis", "game"), env.get("PYTHONPATH", "")])
+    output = subprocess.run([sys.executable, "-c", CHILD], env=env, cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    import_time, first_turn_time, warmup_time = map(float, output.split())
+    return import_time, first_turn_time, warmup_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Exit with an error if the best cold start takes longer than this")
+    args = parser.parse_args()
+
+    totals = []
+    for run in range(args.runs):
+        import_time, first_turn_time, warmup_time = measure()
+        totals.append(import_time + first_turn_time)
+        print(f"Run {run + 1}: import {import_time:.3f}s, first turn {first_turn_time:.3f}s, "
+              f"total {totals[-1]:.3f}s, then warmup {warmup_time:.3f}s")
+
+    if args.max_seconds is not None and min(totals) > args.max_seconds:
+        print(f"Cold start of {min(totals):.3f}s is over the budget of {args.max_seconds:.3f}s")
+        sys.exit(1)
@@ -0,0 +1,105 @@
+"""
+Differential check of the game engine backends: plays the same random games on every backend and asserts that
+the generated moves and the resulting states are identical after every turn.
+
+Moves are drawn from the move list at the start of the turn and every player may make several, so later moves of a
+turn can be stale. This also checks that the backends agree on moves that are no longer valid.
+
+Usage: python testing/differential_backends.py [--games N] [--turns T] [--seed S] [--backends numba python ...]
+"""
+import argparse
+import copy
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "genghis", "game")]
+
+import numpy as np
+
+from genghis.game.action import ActionBatch
+from genghis.game.backends import GAME_BACKENDS, create_game
+from genghis.game.move import Move
+from grid import Grid
+
+
+def _assert_same_state(reference, game, backend: str, game_index: int, turn: int):
+    for name in ("owners_flat", "armies_flat", "types_flat"):
+        expected, actual = np.asarray(getattr(reference, name)), np.asarray(getattr(game, name))
+        if not np.array_equal(expected, actual):
+            tile = int(np.flatnonzero(expected != actual)[0])
+            raise AssertionError(f"Game {game_index}, turn {turn}: {name} of backend {backend!r} differs at tile "
+                                 f"{divmod(tile, reference.width)}: expected {expected[tile]}, got {actual[tile]}")
+    for name in ("_turn", "priority_player"):
+        assert getattr(reference, name) == getattr(game, name), \
+            f"Game {game_index}, turn {turn}: {name} of backend {backend!r} differs."
+    for name in ("owners", "armies", "types"):
+        assert np.array_equal(getattr(reference.grid, name), getattr(game.grid, name)), \
+            f"Game {game_index}, turn {turn}: grid.{name} of backend {backend!r} is out of sync."
+
+
+def run_differential(backends: list[str], num_games=20, num_turns=300, seed=0, max_moves_per_player=2) -> int:
+    """
+    Play random games on every backend and compare them after every turn. The first backend is the reference.
+
+    Args:
+        backends: Names of the backends to compare, see genghis.game.backends.GAME_BACKENDS
+        num_games: Number of games to play
+        num_turns: Number of turns per game
+        seed: Seed of the maps and of the moves
+        max_moves_per_player: Maximum number of moves a player makes per turn
+
+    Returns:
+        The number of turns compared
+
+    Raises:
+        AssertionError: At the first move list or state that differs between backends
+    """
+    rng = np.random.default_rng(seed)
+    turns_compared = 0
+    for game_index in range(num_games):
+        grid = Grid(width=int(rng.integers(4, 12)), height=int(rng.integers(4, 12)), players=int(rng.integers(2, 5)),
+                    uniform_city_density=0.05, uniform_mountain_density=0.15, seed=seed + game_index)
+        games = {backend: create_game(copy.deepcopy(grid), backend) for backend in backends}
+        reference = games[backends[0]]
+        for game in games.values():
+            game.priority_player = reference.priority_player
+
+        for turn in range(num_turns):
+            moves = []
+            for player in range(reference.num_players):
+                player_moves = reference.generate_valid_moves_array(player).copy()
+                for backend, game in games.items():
+                    assert np.array_equal(player_moves, game.generate_valid_moves_array(player)), \
+                        f"Game {game_index}, turn {turn}: moves of player {player} differ on backend {backend!r}."
+                if len(player_moves) == 0:
+                    continue
+                for row in rng.choice(len(player_moves), size=rng.integers(1, max_moves_per_player + 1)):
+                    move = player_moves[row].copy()
+                    move[5] = rng.random() < 0.3
+                    moves.append(move)
+            moves = np.array(moves, dtype=np.int16).reshape(-1, 6)
+
+            for backend, game in games.items():
+                if turn % 3 == 1:  # Alternate between the array, Move object and ActionBatch interfaces
+                    passes = [Move(player, True) for player in range(reference.num_players)]  # Must be skipped
+                    game.process_turn(passes + [Move(*move[:1], False, *move[1:5], bool(move[5])) for move in moves])
+                elif turn % 3 == 2:
+                    game.process_turn(ActionBatch.from_moves(moves))
+                else:
+                    game.process_turn(moves)
+                _assert_same_state(reference, game, backend, game_index, turn)
+            turns_compared += 1
+    return turns_compared
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", default=list(GAME_BACKENDS), choices=list(GAME_BACKENDS))
+    args = parser.parse_args()
+
+    turns = run_differential(args.backends, args.games, args.turns, args.seed)
+    print(f"Backends {', '.join(args.backends)} agree on {turns} turns over {args.games} games.")
@@ -0,0 +1,80 @@
+"""
+Measures how long a fresh interpreter takes to import the lightweight parts of the package, and checks that they
+do not pull in the heavy dependencies (numba, scipy, line_profiler) or leave side effects behind. Short-lived bot
+workers pay this on every start.
+
+Usage: python testing/import_time.py [--runs N] [--max-seconds S]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must stay cheap to import, e.g. for bots that only need Observation and Action
+LIGHT_MODULES = ["genghis.game.observation", "genghis.game.action", "genghis.game.backends", "genghis.api.client"]
+HEAVY_DEPENDENCIES = ["numba", "scipy", "line_profiler"]
+
+CHILD = """
+import importlib, io, json, logging, sys, time
+import numpy as np
+print_options = np.get_printoptions()
+root_handlers = list(logging.getLogger().handlers)
+stdout, sys.stdout = sys.stdout, io.StringIO()
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+printed, sys.stdout = sys.stdout.getvalue(), stdout
+print(json.dumps({
+    "seconds": seconds,
+    "heavy": [name for name in sys.argv[2:] if name in sys.modules],
+    "printed": bool(printed),
+    "print_options_changed": np.get_printoptions() != print_options,
+    "logging_changed": list(logging.getLogger().handlers) != root_handlers,
+}))
+"""
+
+
+def measure(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter. numpy is imported beforehand, since every caller needs it anyway.
+
+    Args:
+        module: Name of the module to import
+
+    Returns:
+        The seconds the import took, the heavy dependencies it loaded and which side effects it had
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, os.path.join(ROOT, "genghis", "game"), env.get("PYTHONPATH", "")])
+    output = subprocess.run([sys.executable, "-c", CHILD, module, *HEAVY_DEPENDENCIES], env=env, cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=0.5,
+                        help="Exit with an error if the best import of any module takes longer than this")
+    args = parser.parse_args()
+
+    failures = []
+    for module in LIGHT_MODULES:
+        results = [measure(module) for _ in range(args.runs)]
+        best = min(result["seconds"] for result in results)
+        result = results[0]
+        print(f"{module}: {best * 1000:.1f}ms")
+        if best > args.max_seconds:
+            failures.append(f"{module} takes {best:.3f}s to import, over the budget of {args.max_seconds:.3f}s")
+        if result["heavy"]:
+            failures.append(f"{module} imports {', '.join(result['heavy'])}")
+        for effect in ("printed", "print_options_changed", "logging_changed"):
+            if result[effect]:
+                failures.append(f"{module} has an import side effect: {effect.replace('_', ' ')}")
+
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
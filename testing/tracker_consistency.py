@@ -0,0 +1,151 @@
+"""
+Consistency check of the bookkeeping LocalGame keeps up to date incrementally: the undo log, the Zobrist hash, the
+per-player tile index and statistics, the legal moves and the vision bits. Plays random sequences of make_move,
+process_turn, unmake_move/unmake_turn, fork and restore, on two maps of the same shape so that pooled games and
+snapshots are reused across maps. After every step, the tracker is compared with one rebuilt from scratch and the
+vision with Grid._compute_vision_mask_traditional.
+
+Usage: python testing/tracker_consistency.py [--games N] [--steps S] [--seed S]
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "genghis", "game")]
+
+import numpy as np
+
+from genghis.game.game import GamePool, LocalGame, TrackerState, _new_tracker, _rebuild_tracker
+from grid import Grid
+
+
+def _assert_consistent(game: LocalGame, where: str):
+    tracker = game.tracker
+    rebuilt = _new_tracker(game.height * game.width, game.num_players, tracker.passable_dirs,
+                           tracker.vision_neighbours)
+    _rebuild_tracker(rebuilt, game.owners_flat, game.armies_flat, game.types_flat)
+    for name in TrackerState._fields:
+        if name in ("tile_head", "tile_next", "tile_prev"):  # The tile lists are unordered, they are compared below
+            continue
+        assert np.array_equal(getattr(tracker, name), getattr(rebuilt, name)), f"{where}: tracker.{name} is stale."
+
+    for player in range(game.num_players):
+        tiles = game.owned_tiles(player)
+        assert np.array_equal(np.sort(tiles), np.flatnonzero(game.owners_flat == player)), \
+            f"{where}: the tile list of player {player} is stale."
+        if len(tiles):
+            assert tracker.tile_head[player] == tiles[0] and tracker.tile_prev[tiles[0]] == -1 \
+                   and np.array_equal(tracker.tile_prev[tiles[1:]], tiles[:-1]) \
+                   and np.array_equal(tracker.tile_next[tiles], np.append(tiles[1:], -1)), \
+                f"{where}: the tile links of player {player} are stale."
+        else:
+            assert tracker.tile_head[player] == -1, f"{where}: player {player} has no tiles but a list head."
+        legal = game.legal_moves_array(player)
+        generated = game.generate_valid_moves_array(player)
+        assert sorted(map(tuple, legal.tolist())) == sorted(map(tuple, generated.tolist())), \
+            f"{where}: the legal moves of player {player} differ from the generated ones."
+        assert np.array_equal(game.visible_mask(player), game.grid._compute_vision_mask_traditional(player)), \
+            f"{where}: the vision of player {player} is stale."
+
+    assert np.array_equal(game.tracker.passable_dirs, rebuilt.passable_dirs), f"{where}: passable_dirs is stale."
+
+
+def _assert_same_state(game: LocalGame, snapshot, where: str):
+    for name, expected in (("owners_flat", snapshot.owners), ("armies_flat", snapshot.armies),
+                           ("types_flat", snapshot.types)):
+        assert np.array_equal(getattr(game, name), expected), f"{where}: {name} was not restored."
+    assert (game._turn, game.priority_player) == (snapshot.turn, snapshot.priority_player), \
+        f"{where}: the turn counters were not restored."
+
+
+def _random_moves(game: LocalGame, rng: np.random.Generator) -> np.ndarray:
+    moves = []
+    for player in range(game.num_players):
+        player_moves = game.generate_valid_moves_array(player)
+        for row in rng.choice(len(player_moves), size=min(len(player_moves), rng.integers(0, 3)), replace=False):
+            move = player_moves[row].copy()
+            move[5] = rng.random() < 0.3
+            if rng.random() < 0.05:  # process_turn doesn't validate arrays, a move onto its own start is a no-op
+                move[3:5] = move[1:3]
+            moves.append(move)
+    return np.array(moves, dtype=np.int16).reshape(-1, 6)
+
+
+def run_consistency(num_games=10, num_steps=400, seed=0) -> int:
+    """
+    Play random operation sequences and check the tracker after every one.
+
+    Args:
+        num_games: Number of map pairs to play on
+        num_steps: Number of operations per map pair
+        seed: Seed of the maps and of the operations
+
+    Returns:
+        The number of steps checked
+
+    Raises:
+        AssertionError: At the first step where the tracker, the vision or an undone state is wrong
+    """
+    rng = np.random.default_rng(seed)
+    steps_checked = 0
+    for game_index in range(num_games):
+        width, height, players = int(rng.integers(4, 12)), int(rng.integers(4, 12)), int(rng.integers(2, 5))
+        games = [LocalGame(Grid(width=width, height=height, players=players, uniform_city_density=0.05,
+                                uniform_mountain_density=0.15, seed=seed + 2 * game_index + map_index))
+                 for map_index in range(2)]
+        pool = GamePool()
+        snapshots = [game.snapshot() for game in games]
+        undo_stack = [[], []]  # (is_turn, snapshot before the move or turn) of each game
+
+        for step in range(num_steps):
+            index = int(rng.integers(2))
+            game = games[index]
+            where = f"Game {game_index}, step {step}"
+            operation = rng.choice(["move", "turn", "turn", "unmake", "fork", "restore", "snapshot"])
+            record = rng.random() < 0.8
+            if operation in ("move", "turn") and not record:  # Earlier moves can't be undone across this one
+                undo_stack[index] = []
+
+            if operation == "move":
+                moves = game.generate_valid_moves_array(int(rng.integers(players)))
+                if len(moves):
+                    before = game.snapshot()
+                    move = moves[rng.integers(len(moves))]
+                    game.make_move(*move[1:5], move[0], rng.random() < 0.3, record=record)
+                    if record:
+                        undo_stack[index].append((False, before))
+            elif operation == "turn":
+                before = game.snapshot()
+                game.process_turn(_random_moves(game, rng), record=record)
+                if record:
+                    undo_stack[index].append((True, before))
+            elif operation == "unmake" and undo_stack[index]:
+                is_turn, before = undo_stack[index].pop()
+                game.unmake_turn() if is_turn else game.unmake_move()
+                _assert_same_state(game, before, where)
+            elif operation == "fork":  # Fork either game into a pooled one, which may have been used for the other
+                source = games[int(rng.integers(2))]
+                games[index] = pool.fork(source)
+                pool.release(game)
+                undo_stack[index] = []
+            elif operation == "restore":
+                game.restore(snapshots[int(rng.integers(2))])
+                undo_stack[index] = []
+            elif operation == "snapshot":
+                game.snapshot(out=snapshots[index])
+
+            _assert_consistent(games[index], where)
+            steps_checked += 1
+    return steps_checked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    steps = run_consistency(args.games, args.steps, args.seed)
+    print(f"Tracker, vision and undo log are consistent over {steps} steps of {args.games} games.")